@@ -0,0 +1,23 @@
+"""
+Benchmarks for the hot paths of the endpoint
+
+They need the workspace's venv created by poetry, run them under the endpoint directory:
+    python -m benchmark.<name> --help
+"""
+import statistics
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, max(0, round(p / 100 * len(samples)) - 1))
+    return samples[index]
+
+def report(title, samples, unit='ms', scale=1000):
+    """Print the latency distribution of the samples measured in seconds"""
+    print('{}: n={} mean={:.3f}{unit} p50={:.3f}{unit} p99={:.3f}{unit} max={:.3f}{unit}'.format(
+        title, len(samples),
+        statistics.mean(samples) * scale,
+        percentile(samples, 50) * scale,
+        percentile(samples, 99) * scale,
+        max(samples) * scale,
+        unit=unit))
@@ -0,0 +1,166 @@
+"""
+Measure how long daemon.start_test takes from the request of the webserver to the test library's RPC server ready
+
+start_test downloads the bundle, then takes an idle test library process from the warm pool, which has
+activated the workspace's venv and imported the common modules in advance. It is measured
+    - without a pool, a process is spawned for each test like before
+    - cold, the bundle changes for every test so the pool is recycled and the eggs are downloaded again
+    - warm, the bundle stays the same so the idle process is taken right away
+A stub HTTP server and a stub websocket server stand in for the webserver, the bundle is an egg built on the fly.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+import websockets
+from bson.objectid import ObjectId
+
+from test_endpoint.daemon import daemon
+
+from . import report
+
+TEST_LIBRARY = '''
+class benchmark_lib(object):
+    def __init__(self, config, task_id):
+        pass
+
+    def echo(self, message):
+        return message
+# version {}
+'''
+
+
+class Bundle():
+    """The bundle served by the stub server, one egg with the test library"""
+    def __init__(self):
+        self.version = 0
+        self.build()
+
+    def build(self):
+        self.version += 1
+        with BytesIO() as buf:
+            with zipfile.ZipFile(buf, 'w') as egg:
+                egg.writestr('benchmark_lib.py', TEST_LIBRARY.format(self.version))
+            self.egg = buf.getvalue()
+        self.etag = hashlib.sha256(self.egg).hexdigest()
+
+def start_stub_http_server(port, bundle):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path.startswith('/taskresource/'):
+                self.reply(406)
+            elif 'manifest' in query:
+                if self.headers.get('If-None-Match') == '"{}"'.format(bundle.etag):
+                    self.reply(304)
+                else:
+                    self.reply(200, json.dumps({'eggs': {'benchmark_lib.egg': bundle.etag}, 'etag': bundle.etag}).encode(),
+                               'application/json')
+            elif 'egg' in query:
+                self.reply(200, bundle.egg, 'application/octet-stream')
+            else:
+                self.reply(404)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self.reply(200, b'{}', 'application/json')
+
+        def reply(self, status, body=b'', content_type=None):
+            self.send_response(status)
+            if content_type:
+                self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def start_stub_rpc_server(port):
+    async def handler(ws, path):
+        if path == '/rpc':
+            # the join message
+            await ws.recv()
+            await ws.send('{}')
+        await ws.wait_closed()
+
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(websockets.serve(handler, '127.0.0.1', port))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+
+def measure(config, bundle, count, interval, new_bundle):
+    d = daemon(config, None)
+    # the first test downloads the bundle and warms the pool up for it
+    d.start_test('benchmark', 'benchmark_lib', str(ObjectId()))
+    d.stop_test('benchmark', 'PASS')
+    time.sleep(interval)
+
+    latencies = []
+    for i in range(count):
+        if new_bundle:
+            bundle.build()
+        begin = time.perf_counter()
+        d.start_test('benchmark', 'benchmark_lib', str(ObjectId()))
+        latencies.append(time.perf_counter() - begin)
+        d.stop_test('benchmark', 'PASS')
+        # let the pool warm up again like the gap between two tests
+        time.sleep(interval)
+    d.pool.close()
+    return latencies
+
+def run(count, pool_size, interval, modules, port, http_port):
+    bundle = Bundle()
+    start_stub_rpc_server(port)
+    server = start_stub_http_server(http_port, bundle)
+    root = tempfile.mkdtemp()
+    config = {
+        'server_url': 'http://127.0.0.1:{}'.format(http_port),
+        'server_host': '127.0.0.1',
+        'server_rpc_port': port,
+        'join_id': '',
+        'uuid': '',
+        'download_dir': os.path.join(root, 'download'),
+        'resource_dir': os.path.join(root, 'resource'),
+        'egg_cache_dir': os.path.join(root, 'eggs'),
+        'warm_modules': modules,
+    }
+    report('before: spawn a process per test',
+           measure(dict(config, warm_pool_size=0), bundle, count, interval, False))
+    report(f'cold: warm pool of {pool_size}, a new bundle per test',
+           measure(dict(config, warm_pool_size=pool_size), bundle, count, interval, True))
+    report(f'warm: warm pool of {pool_size}, the same bundle',
+           measure(dict(config, warm_pool_size=pool_size), bundle, count, interval, False))
+    server.shutdown()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--count', type=int, default=20, help='the number of tests started')
+    parser.add_argument('-s', '--pool-size', type=int, default=1, help='the size of the warm pool')
+    parser.add_argument('-i', '--interval', type=float, default=3, help='seconds between two tests')
+    parser.add_argument('-m', '--modules', nargs='*', default=['robot'], help='the modules imported in advance')
+    parser.add_argument('-p', '--port', type=int, default=5555, help='the port of the stub websocket server')
+    parser.add_argument('--http-port', type=int, default=5000, help='the port of the stub HTTP server')
+    args = parser.parse_args()
+    run(args.count, args.pool_size, args.interval, args.modules, args.port, args.http_port)
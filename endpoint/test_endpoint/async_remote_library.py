@@ -25,7 +25,9 @@ import select
 import signal
 import sys
 import threading
+import time
 import traceback
+import zlib
 
 if sys.version_info < (3,):
     from SimpleXMLRPCServer import SimpleXMLRPCServer
@@ -46,6 +48,12 @@ __version__ = '0.1'
 BINARY = re.compile('[\x00-\x08\x0B\x0C\x0E-\x1F]')
 NON_ASCII = re.compile('[\x80-\xff]')
 
+# console output of keywords is relayed to the server in batches bounded by size and time
+MSG_FLUSH_SIZE = 16 * 1024
+MSG_FLUSH_INTERVAL = 0.1
+# batches larger than this are sent zlib compressed in a binary frame, 0 to disable the compression
+MSG_COMPRESS_SIZE = 4 * 1024
+
 
 class AsyncRemoteLibrary():
     def __init__(self, library, ws):
@@ -285,20 +293,69 @@ class KeywordRunner(object):
             return arg.data
         return arg
 
-class MyStringIO(StringIO):
+class MessageBatcher(object):
+    """
+    Send the console output of a keyword to the /msg websocket in batches
+
+    A batch is sent once MSG_FLUSH_SIZE characters are buffered or its first write is MSG_FLUSH_INTERVAL old.
+    stdout and stderr share one batcher so that the order of the output is kept.
+    """
+
     def __init__(self, ws):
+        self.ws, self.task_id = ws if ws else (None, None)
+        self.loop = asyncio.get_event_loop()
+        self._buffer = []
+        self._size = 0
+        self._since = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def write(self, s):
+        if not self.ws or not s:
+            return
+        with self._lock:
+            self._buffer.append(s)
+            self._size += len(s)
+            if self._since is None:
+                self._since = time.monotonic()
+            if self._size >= MSG_FLUSH_SIZE or time.monotonic() - self._since >= MSG_FLUSH_INTERVAL:
+                self._flush()
+            elif self._timer is None:
+                # a keyword awaiting something may not write again for a while
+                self._timer = self.loop.call_soon_threadsafe(self._start_timer)
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _start_timer(self):
+        with self._lock:
+            if self._buffer:
+                self._timer = self.loop.call_later(MSG_FLUSH_INTERVAL, self.flush)
+
+    def _flush(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self._since = None
+        if not self._buffer:
+            return
+        data = ''.join(self._buffer).replace('\r\n', '\n').replace('\n', '\r\n')
+        self._buffer = []
+        self._size = 0
+        msg = json.dumps({'task_id': self.task_id, 'data': data})
+        if MSG_COMPRESS_SIZE and len(msg) >= MSG_COMPRESS_SIZE:
+            msg = zlib.compress(msg.encode('utf-8'))
+        asyncio.run_coroutine_threadsafe(self.ws.send(msg), self.loop)
+
+class MyStringIO(StringIO):
+    def __init__(self, batcher):
         super().__init__()
-        self.ws = ws[0]
-        self.task_id = ws[1]
+        self.batcher = batcher
 
     def write(self, s):
         super().write(s)
-        if self.ws:
-            ss = json.dumps({
-                'task_id': self.task_id,
-                'data': s.replace('\r\n', '\n').replace('\n', '\r\n')
-            })
-            asyncio.run_coroutine_threadsafe(self.ws.send(ss), asyncio.get_event_loop())
+        self.batcher.write(s)
 
 class StandardStreamInterceptor(object):
 
@@ -306,13 +363,15 @@ class StandardStreamInterceptor(object):
         self.output = ''
         self.origout = sys.stdout
         self.origerr = sys.stderr
-        sys.stdout = MyStringIO(ws)
-        sys.stderr = MyStringIO(ws)
+        self.batcher = MessageBatcher(ws)
+        sys.stdout = MyStringIO(self.batcher)
+        sys.stderr = MyStringIO(self.batcher)
 
     def __enter__(self):
         return self
 
     def __exit__(self, *exc_info):
+        self.batcher.flush()
         stdout = sys.stdout.getvalue()
         stderr = sys.stderr.getvalue()
         close = [sys.stdout, sys.stderr]
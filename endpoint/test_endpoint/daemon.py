@@ -1,4 +1,5 @@
 import asyncio
+import hashlib
 import os
 import shutil
 import sys
@@ -7,12 +8,16 @@ import time
 from contextlib import contextmanager
 from io import BytesIO
 from queue import Empty
+from urllib.parse import quote
 
 import requests
 from bson.objectid import ObjectId
 
 from .venv_run import empty_folder
-from .main import start_remote_server
+from .main import WarmPool
+
+EGG_CACHE_MAX_AGE = 7 * 24 * 3600       # seconds an egg is kept in the egg cache after it was last used
+EGG_CACHE_MAX_SIZE = 1024 * 1024 * 1024 # bytes of the eggs kept, the least recently used ones are pruned first
 
 
 class daemon(object):
@@ -21,6 +26,9 @@ class daemon(object):
         self.running_test = None
         self.config = config
         self.task_id = None
+        self.bundle_etag = None  # the bundle extracted in the download directory
+        self.pool = WarmPool(config, int(config.get('warm_pool_size', 1)))
+        self.pool_etag = None  # the bundle downloaded when the pool's processes were warmed up
 
     def start_test(self, test_case, backing_file, task_id=None):
         # Usually a test is stopped when it ends, need to clean up the remaining server if a test was cancelled or crashed
@@ -34,7 +42,11 @@ class daemon(object):
         self._verify(backing_file)
 
         self._create_test_result(test_case)
-        server, queue = start_remote_server(backing_file, self.config, task_id=self.task_id)
+        # an unknown bundle (etag None) could be anything, so recycle for it as well
+        if not self.bundle_etag or self.bundle_etag != self.pool_etag:
+            self.pool.recycle()
+            self.pool_etag = self.bundle_etag
+        server, queue = self.pool.start(backing_file, task_id=self.task_id)
         self.running_test = server
 
         # time.sleep(3)
@@ -51,32 +63,116 @@ class daemon(object):
             self.task_id = None
 
     def _download_file(self, endpoint, dest_dir):
-        if not os.path.exists(dest_dir):
-            os.mkdir(dest_dir)
-        else:
-            empty_folder(dest_dir)
+        self._prepare_dir(dest_dir)
 
         url = "{}/{}".format(self.config["server_url"], endpoint)
         print('Start to download file from {}'.format(url))
 
-        r = requests.get(url)
-        if r.status_code == 406:
-            print('No files need to download')
-            return
+        with requests.get(url, stream=True) as r:
+            if r.status_code == 406:
+                print('No files need to download')
+                return
 
-        if r.status_code != 200:
-            raise AssertionError('Downloading file failed')
+            if r.status_code != 200:
+                raise AssertionError('Downloading file failed')
 
-        temp = BytesIO()
-        temp.write(r.content)
+            # the tarball is streamed by the server, extract it while downloading
+            with tarfile.open(fileobj=r.raw, mode='r|*') as tarFile:
+                tarFile.extractall(dest_dir)
         print('Downloading test file succeeded')
 
-        temp.seek(0)
-        with tarfile.open(fileobj=temp) as tarFile:
+    def _download_bundle(self, backing_file, task_id, dest_dir):
+        """
+        Download the test bundle by its manifest, only the eggs not in the local egg cache are downloaded
+
+        Nothing is downloaded if the bundle is the same as the one in the download directory
+        """
+        url = "{}/test/script?id={}&test={}".format(self.config["server_url"], task_id, backing_file)
+        headers = {}
+        if self.bundle_etag and os.path.exists(dest_dir):
+            headers['If-None-Match'] = '"{}"'.format(self.bundle_etag)
+
+        r = requests.get(url + '&manifest=true', headers=headers)
+        if r.status_code == 304:
+            print('Test bundle is up to date')
+            return
+        if r.status_code != 200:
+            raise AssertionError('Downloading file failed')
+        if not r.headers.get('Content-Type', '').startswith('application/json'):
+            # the server doesn't support the manifest, the whole bundle is returned
+            self.bundle_etag = None
+            self._extract(r.content, dest_dir)
+            return
+        manifest = r.json()
+
+        cache_dir = self.config["egg_cache_dir"]
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        for name, digest in manifest['eggs'].items():
+            cached = os.path.join(cache_dir, digest + os.path.splitext(name)[1])
+            if os.path.exists(cached):
+                continue
+            print('Start to download {}'.format(name))
+            r = requests.get(url + '&egg={}'.format(quote(name)))
+            if r.status_code != 200:
+                raise AssertionError('Downloading file {} failed'.format(name))
+            if hashlib.sha256(r.content).hexdigest() != digest:
+                raise AssertionError('Verifying downloaded file {} failed'.format(name))
+            with open(cached + '.tmp', 'wb') as f:
+                f.write(r.content)
+            os.replace(cached + '.tmp', cached)
+
+        self.bundle_etag = None
+        self._prepare_dir(dest_dir)
+        used = set()
+        for name, digest in manifest['eggs'].items():
+            cached = digest + os.path.splitext(name)[1]
+            shutil.copyfile(os.path.join(cache_dir, cached), os.path.join(dest_dir, name))
+            os.utime(os.path.join(cache_dir, cached))
+            used.add(cached)
+        self.bundle_etag = manifest['etag']
+        print('Downloading test bundle succeeded')
+        self._prune_egg_cache(cache_dir, used)
+
+    def _prune_egg_cache(self, cache_dir, used):
+        """
+        Remove the eggs not used for EGG_CACHE_MAX_AGE, then the least recently used ones beyond EGG_CACHE_MAX_SIZE
+
+        The eggs of the current bundle are always kept.
+        """
+        eggs = []
+        for entry in os.scandir(cache_dir):
+            if entry.name in used or not entry.is_file():
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            eggs.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in used)
+        now = time.time()
+        for mtime, size, path in sorted(eggs, reverse=True):
+            if now - mtime <= EGG_CACHE_MAX_AGE and total + size <= EGG_CACHE_MAX_SIZE:
+                total += size
+                continue
+            try:
+                os.unlink(path)
+            except OSError as e:
+                print('Failed to prune {}: {}'.format(path, e))
+
+    def _prepare_dir(self, dest_dir):
+        if not os.path.exists(dest_dir):
+            os.mkdir(dest_dir)
+        else:
+            empty_folder(dest_dir)
+
+    def _extract(self, content, dest_dir):
+        self._prepare_dir(dest_dir)
+        with tarfile.open(fileobj=BytesIO(content)) as tarFile:
             tarFile.extractall(dest_dir)
 
     def _download(self, backing_file, task_id):
-        self._download_file(f'test/script?id={task_id}&test={backing_file}', self.config["download_dir"])
+        self._download_bundle(backing_file, task_id, self.config["download_dir"])
         if task_id:
             ObjectId(task_id)  # validate the task id
             self._download_file('taskresource/{}'.format(task_id), self.config["resource_dir"])
@@ -14,6 +14,7 @@ import socket
 import subprocess
 import sys
 import tarfile
+import threading
 import time
 import traceback
 import uuid
@@ -63,24 +64,50 @@ def install_eggs(egg_path):
     sys.path = org_path
 
 class test_library_rpc(Process):
-    def __init__(self, backing_file, task_id, config, queue, rpc_daemon=False):
+    def __init__(self, backing_file, task_id, config, queue, rpc_daemon=False, jobs=None):
         super().__init__()
         self.backing_file = backing_file
         self.task_id = task_id
         self.config = config
         self.host = config['server_host']
         self.rpc_port = config['server_rpc_port']
-        self.name = backing_file
+        self.name = backing_file or 'warm test library'
         self.websocket = None
         self.loop = None
         self.rpc_daemon = rpc_daemon
         self.queue = queue
+        self.jobs = jobs  # a warm process waits for its backing file and task id from it
+        self.parent_pid = os.getpid()
+
+    def wait_for_job(self):
+        """
+        Import the common modules in advance, then wait for the test to run, return False if the pool is gone
+        """
+        for module in self.config.get('warm_modules', []):
+            try:
+                importlib.import_module(module)
+            except ImportError as e:
+                print(f'Failed to pre-import the module {module}: {e}')
+        while True:
+            try:
+                job = self.jobs.get(timeout=1)
+            except queue.Empty:
+                if os.getppid() != self.parent_pid:
+                    return False
+                continue
+            if not job:
+                return False
+            self.backing_file, self.task_id = job
+            self.name = self.backing_file
+            return True
 
     def run(self):
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
         if not self.rpc_daemon:
             with activate_workspace('workspace'):
+                if self.jobs and not self.wait_for_job():
+                    return
                 with install_eggs(self.config['download_dir']):
                     task = asyncio.ensure_future(self.go())
                     task.add_done_callback(self.task_done_check)
@@ -128,6 +155,8 @@ class test_library_rpc(Process):
             print(f'Could not find any test library in the module {module_name}')
             return
 
+        # the rpc daemon keeps its test library, e.g. the warm pool, across the reconnections
+        test_lib_instance = None
         while True:
             try:
                 async with websockets.connect(f'ws://{self.host}:{self.rpc_port}/rpc') as rpc_ws, websockets.connect(f'ws://{self.host}:{self.rpc_port}/msg') as msg_ws:
@@ -143,7 +172,9 @@ class test_library_rpc(Process):
                     self.queue.put(1)
                     print('Start the RPC server')
                     try:
-                        await SecureWebsocketRPC(rpc_ws, AsyncRemoteLibrary(test_lib(self.config, self.task_id), (msg_ws, self.task_id)), method_prefix='').run()
+                        if not test_lib_instance or not self.rpc_daemon:
+                            test_lib_instance = test_lib(self.config, self.task_id)
+                        await SecureWebsocketRPC(rpc_ws, AsyncRemoteLibrary(test_lib_instance, (msg_ws, self.task_id)), method_prefix='').run()
                     except websockets.exceptions.ConnectionClosedError:
                         print('Websocket closed')
             except ConnectionRefusedError:
@@ -161,6 +192,55 @@ def start_remote_server(backing_file, config, task_id=None, rpc_daemon=False):
     process.start()
     return process, queue
 
+class WarmPool():
+    """
+    Test library processes spawned in advance with the workspace's venv activated and the common modules imported
+
+    Starting a test only hands the backing file and the task id to an idle process, the pool is refilled right away.
+    """
+    def __init__(self, config, size):
+        self.config = config
+        self.size = size
+        self.idle = []  # [(process, jobs queue, ready queue)]
+        self.lock = threading.Lock()
+        self.fill()
+
+    def fill(self):
+        with self.lock:
+            self.idle = [worker for worker in self.idle if worker[0].is_alive()]
+            while len(self.idle) < self.size:
+                jobs, queue = Queue(), Queue()
+                process = test_library_rpc(None, None, self.config, queue, jobs=jobs)
+                process.start()
+                self.idle.append((process, jobs, queue))
+
+    def start(self, backing_file, task_id=None):
+        with self.lock:
+            while self.idle:
+                process, jobs, queue = self.idle.pop(0)
+                if process.is_alive():
+                    jobs.put((backing_file, task_id))
+                    break
+            else:
+                process = None
+        self.fill()
+        if not process:
+            return start_remote_server(backing_file, self.config, task_id=task_id)
+        return process, queue
+
+    def close(self):
+        with self.lock:
+            for process, jobs, queue in self.idle:
+                jobs.put(None)
+            self.idle = []
+
+    def recycle(self):
+        """
+        Replace the idle processes, e.g. once the downloaded eggs changed after they were warmed up
+        """
+        self.close()
+        self.fill()
+
 def get_websocket_ports(url):
     ret = requests.get(f'{url}/setting/rpc')
     if ret.status_code != 200:
@@ -196,6 +276,7 @@ def read_toml_config(config_file = "pyproject.toml", host=None, port=None):
         **toml_config['tool']['robotest']['settings'],
         'download_dir': os.path.abspath(os.path.join('workspace', 'downloads')),
         'resource_dir': os.path.abspath(os.path.join('workspace', 'resources')),
+        'egg_cache_dir': os.path.abspath(os.path.join('workspace', 'eggs')),
     }
     if host:
         config["server_host"] = host
@@ -1,10 +1,18 @@
+import hashlib
+import json
 import os
+import shutil
 import site
 import subprocess
 import sys
 from contextlib import contextmanager
 from copy import copy
 
+VENV_CACHE_FILE = '.venv_path.json'                 # the venv path resolved by poetry, saved in the workspace
+VENV_CACHE_KEYS = ('pyproject.toml', 'poetry.lock') # the venv is resolved again once any of them changed
+
+_venv_paths = {}  # {workspace: (file stats, venv path)}
+
 
 def empty_folder(folder):
     for root, dirs, files in os.walk(folder):
@@ -22,13 +30,16 @@ def pushd(new_path):
 
 @contextmanager
 def activate_venv(venv):
+    """
+    Activate the venv by manipulating PATH and sys.path only, no subprocess is spawned
+    """
     old_os_path = os.environ.get('PATH', '')
     if sys.platform == 'win32':
-        os.environ['PATH'] = os.path.dirname(os.path.join(venv, 'Scripts')) + os.pathsep + old_os_path
+        os.environ['PATH'] = os.path.join(venv, 'Scripts') + os.pathsep + old_os_path
         site_packages = os.path.join(venv, 'Lib', 'site-packages')
     else:
-        os.environ['PATH'] = os.path.dirname(os.path.join(venv, 'bin')) + os.pathsep + old_os_path
-        site_packages = os.path.join(venv, 'lib', 'python%s' % sys.version[:3], 'site-packages')
+        os.environ['PATH'] = os.path.join(venv, 'bin') + os.pathsep + old_os_path
+        site_packages = os.path.join(venv, 'lib', 'python%d.%d' % sys.version_info[:2], 'site-packages')
     prev_sys_path = list(sys.path)
     site.addsitedir(site_packages)
     sys.real_prefix = sys.prefix
@@ -43,20 +54,85 @@ def activate_venv(venv):
     yield
     os.environ['PATH'] = old_os_path
     sys.path = prev_sys_path
+    sys.prefix = sys.real_prefix
+
+def _stat_files(workspace):
+    stats = {}
+    for name in VENV_CACHE_KEYS:
+        try:
+            st = os.stat(os.path.join(workspace, name))
+        except FileNotFoundError:
+            stats[name] = None
+        else:
+            stats[name] = [st.st_mtime_ns, st.st_size]
+    return stats
+
+def _hash_files(workspace):
+    hasher = hashlib.sha1()
+    for name in VENV_CACHE_KEYS:
+        try:
+            with open(os.path.join(workspace, name), 'rb') as f:
+                hasher.update(f.read())
+        except FileNotFoundError:
+            pass
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+def _poetry_env_path(workspace):
+    env = copy(dict(os.environ))
+    if 'VIRTUAL_ENV' in os.environ:
+        del env['VIRTUAL_ENV']
+    try:
+        venv = subprocess.check_output('poetry env info --path', shell=True, universal_newlines=True, env=env, cwd=workspace)
+    except subprocess.CalledProcessError as e:
+        raise AssertionError(f'Failed to get the virtual environment path, please ensure that poetry is in the PATH and virtualenv for workspace has been created')
+    return venv.strip()
+
+def get_venv_path(workspace):
+    """
+    Get the virtual environment path of the workspace, poetry is asked only when it's not cached
+
+    The path is cached in memory and in the workspace's VENV_CACHE_FILE, keyed on the modification times and
+    the content hash of pyproject.toml and poetry.lock. Files touched without any change keep the cache valid.
+    """
+    workspace = os.path.abspath(workspace)
+    stats = _stat_files(workspace)
+    cached = _venv_paths.get(workspace, None)
+    if cached and cached[0] == stats and os.path.isdir(cached[1]):
+        return cached[1]
+
+    cache_file = os.path.join(workspace, VENV_CACHE_FILE)
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (FileNotFoundError, ValueError):
+        cache = {}
+
+    venv = cache.get('venv', None)
+    if venv and os.path.isdir(venv) and cache.get('stats', None) == stats:
+        _venv_paths[workspace] = (stats, venv)
+        return venv
+
+    digest = _hash_files(workspace)
+    if not venv or not os.path.isdir(venv) or cache.get('hash', None) != digest:
+        venv = _poetry_env_path(workspace)
+
+    temp_file = '{}.{}'.format(cache_file, os.getpid())
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump({'venv': venv, 'stats': stats, 'hash': digest}, f)
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        print(f'Failed to save the virtual environment path: {e}')
+    _venv_paths[workspace] = (stats, venv)
+    return venv
 
 @contextmanager
 def activate_workspace(workspace):
     if not os.path.exists(os.path.join(workspace, 'pyproject.toml')):
         raise RuntimeError('workspace\'s configuration file pyproject.toml not found')
     with pushd(workspace):
-        try:
-            env = copy(dict(os.environ))
-            if 'VIRTUAL_ENV' in os.environ:
-                del env['VIRTUAL_ENV']
-            venv = subprocess.check_output('poetry env info --path', shell=True, universal_newlines=True, env=env)
-        except subprocess.CalledProcessError as e:
-            raise AssertionError(f'Failed to get the virtual environment path, please ensure that poetry is in the PATH and virtualenv for workspace has been created')
-        with activate_venv(venv):
+        with activate_venv(get_venv_path('.')):
             yield
 
 def start():
@@ -32,6 +32,13 @@ class Config:
     LOG_FILE_MAX_BYTES = 100 * 1024 * 1024
     LOG_FILE_BACKUP_COUNT = 10
 
+    MAX_RUNNING_TASKS = 100  # robot processes running at the same time for all endpoints
+    XMLRPC_MAX_WORKERS = 64  # keyword calls served at the same time by the local XML RPC server, 0 to serve one by one
+    XMLRPC_MAX_WORKERS_PER_PATH = 4  # keyword calls served at the same time for one endpoint's test library
+    TARBALL_COMPRESS_LEVEL = 6  # gzip level of the served tarballs, 0 to store only, e.g. for the already compressed firmwares
+    TASK_STATISTICS_ROLLUP = False  # count the finished tasks from the daily rollup, run "manage.py rollup" once before enabling it
+    MD_PARSE_CACHE_SIZE = 8192  # parsed markdown files kept in memory, should hold the test suites of the largest package
+
     @classmethod
     def init_app(cls, app):
         # email errors to the administrators
@@ -13,6 +13,7 @@ from ..model.database import Endpoint, TaskQueue, Test, Task, \
             EVENT_CODE_CANCEL_TASK, EVENT_CODE_START_TASK, \
             QUEUE_PRIORITY_MIN, QUEUE_PRIORITY_DEFAULT, QUEUE_PRIORITY_MAX
 from ..util.dto import EndpointDto
+from ..util.prefetch import prefetch_references
 from ..util.response import *
 from ..util import push_event, js2python_bool
 
@@ -68,7 +69,7 @@ class EndpointController(Resource):
             endpoints = Endpoint.objects(**query)
 
         ret = []
-        for ep in endpoints[(page-1)*limit:page*limit]:
+        for ep in prefetch_references(endpoints[(page-1)*limit:page*limit], 'tests', only=('test_suite',)):
             tests = []
             for t in ep.tests:
                 if hasattr(t, 'test_suite'):
@@ -189,8 +190,12 @@ class EndpointController(Resource):
         if endpoint_uid:
             query['endpoint_uid'] = endpoint_uid
 
+        taskqueues = prefetch_references(TaskQueue.objects(**query), 'endpoint', only=('name', 'status', 'uid'))
+        prefetch_references(taskqueues, 'running_task', only=('status', 'test_suite'))
+        prefetch_references(taskqueues, 'tasks', only=('priority', 'test_suite'))
+
         ret = []
-        for taskqueue in TaskQueue.objects(**query):
+        for taskqueue in taskqueues:
             taskqueue_stat = ({
                 'endpoint': taskqueue.endpoint.name,
                 'priority': taskqueue.priority,
@@ -252,16 +257,13 @@ class EndpointController(Resource):
                     return response_message(ENOENT, 'task not found for ' + task['task_id']), 404
                 tasks.append(t)
 
-            if not queue.flush():
+            flushed = queue.flush()
+            if flushed is None:
                 return response_message(EPERM, 'task queue {} {} flushing failed'.format(queue.endpoint.uid, queue.priority)), 401
 
-            queue.acquire_lock()
-            set1 = set(tasks)
-            set2 = set(queue.tasks)
-            task_cancel_set = set2 - set1
+            task_cancel_set = set(flushed) - set(tasks)
             for task in task_cancel_set:
                 task.update(status='cancelled')
-            queue.release_lock()
 
             for task in tasks:
                 # no need to lock task as task queue has been just flushed, no runner is supposed to hold it yet
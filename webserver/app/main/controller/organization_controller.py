@@ -6,9 +6,9 @@ from flask_restx import Resource
 from bson import ObjectId
 
 from ..util.decorator import token_required
-from ..model.database import Organization, Team, User, Test, Task, TaskQueue, TestResult
+from ..model.database import Organization, Team, User, Test, Task, TaskQueue, TaskStat, TestResult
 
-from ..service.auth_helper import Auth
+from ..service.auth_helper import Auth, invalidate_identity
 from ..util.dto import OrganizationDto
 from ..util.response import *
 from ..config import get_config
@@ -88,6 +88,7 @@ class OrganizationList(Resource):
         org.save()
         user.organizations.append(org)
         user.save()
+        invalidate_identity(user)
 
         org.path = name + '#' + str(org.id)
         org_root = USERS_ROOT / org.path
@@ -140,6 +141,7 @@ class OrganizationList(Resource):
                 TestResult.objects(task=task).delete()
             tasks.delete()
         tests.delete()
+        TaskStat.objects(organization=organization).delete()
         TaskQueue.objects(organization=organization).update(to_delete=True, organization=None, team=None)
         
         teams = Team.objects(organization=organization)
@@ -148,6 +150,7 @@ class OrganizationList(Resource):
             team.delete()
 
         organization.delete()
+        invalidate_identity()
 
 @api.route('/avatar/<org_id>')
 class OrganizationAvatar(Resource):
@@ -201,6 +204,7 @@ class OrganizationMember(Resource):
                 return response_message(EPERM, "Can't quit the organization as you are the owner"), 403
             organization.modify(pull__members=user)
             user.modify(pull__organizations=organization)
+            invalidate_identity()
             return response_message(SUCCESS), 200
         else:
             return response_message(EINVAL, "User is not in the organization"), 400
@@ -308,6 +312,7 @@ class OrganizationJoin(Resource):
             organization.modify(push__members=user)
         if organization not in user.organizations:
             user.modify(push__organizations=organization)
+        invalidate_identity()
 
 @api.route('/users')
 class OrganizationUsers(Resource):
@@ -429,3 +434,4 @@ class OrganizationTransfer(Resource):
                 if owner not in team.members:
                     team.members.append(owner)
                 team.save()
+        invalidate_identity()
@@ -11,6 +11,7 @@ from app.main.util.get_path import get_user_scripts_root, get_back_scripts_root,
 from task_runner.util.dbhelper import db_update_test
 from ..config import get_config
 from ..model.database import Test, Package
+from ..util.bundle_cache import invalidate_tree_digest
 from ..util.dto import ScriptDto
 from ..util.tarball import path_to_dict
 from ..util.response import response_message, EINVAL, ENOENT, UNKNOWN_ERROR, SUCCESS, EIO
@@ -134,6 +135,9 @@ class ScriptManagement(Resource):
             else:
                 os.rename(root / script, root / os.path.dirname(dirname) / new_name)
 
+        if script_type == 'test_libraries':
+            invalidate_tree_digest(root)
+
         if basename and script_type == 'test_scripts':
             _script = str(Path(dirname) / new_name) if new_name else script
             if _script.endswith('.md'):
@@ -200,6 +204,8 @@ class ScriptManagement(Resource):
                 current_app.logger.exception(err)
                 return response_message(EIO, 'Error happened while deleting the directory'), 401
 
+        if script_type == 'test_libraries':
+            invalidate_tree_digest(root)
         return response_message(SUCCESS)
 
 @api.route('/upload/')
@@ -242,6 +248,8 @@ class ScriptUpload(Resource):
             found = True
             filename = root / file.filename
             file.save(str(filename))
+            if script_type == 'test_libraries':
+                invalidate_tree_digest(root)
 
         if not found:
             return response_message(EINVAL, 'No files are found in the request'), 401
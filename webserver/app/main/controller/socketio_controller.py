@@ -4,6 +4,31 @@ from ..service.auth_helper import Auth
 from ..util import get_room_id
 from task_runner.runner import ROOM_MESSAGES
 
+def replay_console_log(org_team, task_id, offset=None):
+    """
+    Send the tail of a running task's console log, or a page of it from the byte offset if specified
+
+    The offset sent along with the tail is where the tail starts in the log, the one sent along with a page
+    is where the next page starts.
+    """
+    if org_team not in ROOM_MESSAGES or task_id not in ROOM_MESSAGES[org_team]:
+        return
+    log_buffer = ROOM_MESSAGES[org_team][task_id]
+    if offset is not None:
+        try:
+            offset = int(offset)
+        except (TypeError, ValueError):
+            offset = None
+        else:
+            if offset < 0:
+                offset = None
+    if offset is None:
+        message, offset = log_buffer.tail()
+        emit('console log', {'task_id': task_id, 'message': message, 'offset': offset})
+    else:
+        message, offset = log_buffer.read(offset)
+        emit('console log', {'task_id': task_id, 'message': message, 'offset': offset})
+
 def handle_message(message):
     print(message, request.sid)
 
@@ -19,8 +44,7 @@ def handle_join_room(json):
     if 'task_id' not in json:
         return
     task_id = json['task_id']
-    if org_team in ROOM_MESSAGES and task_id in ROOM_MESSAGES[org_team] and ROOM_MESSAGES[org_team][task_id]:
-        emit('console log', {'task_id': task_id, 'message': ROOM_MESSAGES[org_team][task_id].getvalue()})
+    replay_console_log(org_team, task_id, json.get('offset', None))
 
 def handle_enter_room(json):
     if 'X-Token' not in json:
@@ -33,8 +57,7 @@ def handle_enter_room(json):
     if 'task_id' not in json:
         return
     task_id = json['task_id']
-    if org_team in ROOM_MESSAGES and task_id in ROOM_MESSAGES[org_team] and ROOM_MESSAGES[org_team][task_id]:
-        emit('console log', {'task_id': task_id, 'message': ROOM_MESSAGES[org_team][task_id].getvalue()})
+    replay_console_log(org_team, task_id, json.get('offset', None))
 
 def handle_leave_room(json):
     if 'X-Token' not in json:
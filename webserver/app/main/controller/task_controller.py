@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, time, timedelta
 
 from flask import request, Response, send_from_directory, current_app
 from flask_restx import Resource
@@ -10,7 +10,7 @@ from ..util.decorator import token_required, organization_team_required_by_args,
 from ..util.get_path import get_test_result_path
 from ..util import push_event, js2python_bool
 from ..util.tarball import path_to_dict
-from ..model.database import Task, Test, Endpoint, TaskQueue, EVENT_CODE_CANCEL_TASK, EVENT_CODE_START_TASK, QUEUE_PRIORITY_DEFAULT, QUEUE_PRIORITY_MAX, QUEUE_PRIORITY_MIN
+from ..model.database import Task, TaskStat, Test, Endpoint, TaskQueue, EVENT_CODE_CANCEL_TASK, EVENT_CODE_START_TASK, QUEUE_PRIORITY_DEFAULT, QUEUE_PRIORITY_MAX, QUEUE_PRIORITY_MIN
 from ..util.dto import TaskDto
 # from ..util.dto import Organization_team as _organization_team
 from ..config import get_config
@@ -23,6 +23,37 @@ _task_update = TaskDto.task_update
 _task_cancel = TaskDto.task_cancel
 _task_stat = TaskDto.task_stat
 
+TASK_STAT_FIELDS = {'succeeded': 'successful', 'failed': 'failed', 'running': 'running', 'waiting': 'waiting'}
+
+def count_tasks_by_day(organization, team, start_date, end_date, days, statuses):
+    """
+    Count the tasks of the statuses per day from start_date in one aggregation, return {(day, status): count}
+
+    The waiting tasks are counted by their schedule date, the others by their run date.
+    """
+    conditions = []
+    run_statuses = [s for s in statuses if s != 'waiting']
+    if run_statuses:
+        conditions.append({'status': {'$in': run_statuses}, 'run_date': {'$gte': start_date, '$lte': end_date}})
+    if 'waiting' in statuses:
+        conditions.append({'status': 'waiting', 'schedule_date': {'$gte': start_date, '$lte': end_date}})
+    date = {'$cond': [{'$eq': ['$status', 'waiting']}, '$schedule_date', '$run_date']}
+    pipeline = [
+        {'$match': {'$or': conditions}},
+        {'$group': {
+            '_id': {
+                'day': {'$floor': {'$divide': [{'$subtract': [date, start_date]}, 86400 * 1000]}},
+                'status': '$status'
+            },
+            'count': {'$sum': 1}
+        }}
+    ]
+    counts = {}
+    for item in Task.objects(organization=organization, team=team).aggregate(*pipeline):
+        key = (min(int(item['_id']['day']), days - 1), item['_id']['status'])
+        counts[key] = counts.get(key, 0) + item['count']
+    return counts
+
 @api.route('/result')
 class TaskStatistics(Resource):
     @token_required
@@ -118,45 +149,21 @@ class TaskController(Resource):
         if delta % timedelta(days=1):
             days = days + 1
 
-        stats = []
-        start = start_date
-        end = start + timedelta(days=1) 
-
-        query = {'organization': organization, 'team': team}
-        query2 = {'status': 'waiting', 'organization': organization, 'team': team}
+        if get_config().TASK_STATISTICS_ROLLUP:
+            # the rollup is per UTC day, align the days with it
+            start_date = datetime.combine(start_date.date(), time())
+            days = (end_date - start_date).days + 1
+            counts = count_tasks_by_day(organization, team, start_date, end_date, days, ('running', 'waiting'))
+            for stat in TaskStat.objects(organization=organization, team=team, date__gte=start_date, date__lte=end_date):
+                day = (stat.date - start_date).days
+                counts[(day, 'successful')] = stat.succeeded
+                counts[(day, 'failed')] = stat.failed
+        else:
+            counts = count_tasks_by_day(organization, team, start_date, end_date, days, TASK_STAT_FIELDS.values())
 
+        stats = []
         for d in range(days):
-            if d == (days - 1):
-                end = end_date
-            query['run_date__gte'] = start
-            query2['schedule_date__gte'] = start
-            query['run_date__lte'] = end
-            query2['schedule_date__lte'] = end
-
-            query['status'] = 'successful'
-            tasks = Task.objects(**query)
-            succeeded = tasks.count()
-
-            query['status'] = 'failed'
-            tasks = Task.objects(**query)
-            failed = tasks.count()
-
-            query['status'] = 'running'
-            tasks = Task.objects(**query)
-            running = tasks.count()
-
-            tasks = Task.objects(**query2)
-            waiting = tasks.count()
-            
-            stats.append({
-                'succeeded': succeeded,
-                'failed': failed,
-                'running': running,
-                'waiting': waiting,
-            })
-
-            start = start + timedelta(days=1)
-            end = start + timedelta(days=1)
+            stats.append({field: counts.get((d, status), 0) for field, status in TASK_STAT_FIELDS.items()})
         return stats
 
     @token_required
@@ -295,6 +302,7 @@ class TaskController(Resource):
                         succeeded.append(str(task.id))
         else:
             if task.parallelization:
+                TaskStat.discount_task(task)
                 task.delete()
         if len(failed) != 0:
             return response_message(UNKNOWN_ERROR, 'Task scheduling failed'), 401
@@ -3,7 +3,7 @@ import shutil
 from pathlib import Path
 
 from bson.objectid import ObjectId
-from flask import request, send_from_directory, current_app
+from flask import request, send_from_directory, current_app, Response
 from flask_restx import Resource
 from mongoengine import ValidationError
 
@@ -12,13 +12,12 @@ from app.main.util.get_path import get_test_result_path, get_upload_files_root
 from ..config import get_config
 from ..model.database import Task
 from ..util.dto import TaskResourceDto
-from ..util.tarball import pack_files
+from ..util.tarball import stream_tarfile_from_dir
 from ..util.response import response_message, EINVAL, ENOENT, SUCCESS, EIO
 
 api = TaskResourceDto.api
 _task_resource = TaskResourceDto.task_resource
 
-TARBALL_TEMP = Path('temp')
 UPLOAD_DIR = Path(get_config().UPLOAD_ROOT)
 
 
@@ -46,18 +45,19 @@ class TaskResourceController(Resource):
             return response_message(SUCCESS, 'Upload directory is empty'), 406
 
         upload_root = get_upload_files_root(task)
-        result_root = get_test_result_path(task)
 
         upload_file = request.args.get('file', None)
         if upload_file:
             return send_from_directory(Path(os.getcwd()) / upload_root, upload_file)
 
-        tarball = pack_files(task_id, upload_root, result_root / TARBALL_TEMP)
-        if not tarball:
-            return response_message(EIO, 'Packing task resource files failed'), 401
+        if not os.path.exists(upload_root):
+            return response_message(ENOENT, 'Task upload directory does not exist'), 404
 
-        tarball = os.path.basename(tarball)
-        return send_from_directory(Path(os.getcwd()) / result_root / TARBALL_TEMP, tarball)
+        compresslevel = get_config().TARBALL_COMPRESS_LEVEL
+        tarball = stream_tarfile_from_dir(upload_root, compresslevel)
+        filename = f'{task_id}.tar.gz' if compresslevel else f'{task_id}.tar'
+        return Response(tarball, mimetype='application/gzip' if compresslevel else 'application/x-tar',
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
 
 @api.route('/list')
 @api.param('task_id', 'task id to process')
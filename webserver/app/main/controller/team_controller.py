@@ -6,9 +6,9 @@ from flask_restx import Resource
 from bson import ObjectId
 
 from ..util.decorator import token_required
-from ..model.database import User, Organization, Team, Test, TestResult, TaskQueue, Task
+from ..model.database import User, Organization, Team, Test, TestResult, TaskQueue, TaskStat, Task
 
-from ..service.auth_helper import Auth
+from ..service.auth_helper import Auth, invalidate_identity
 from ..util.dto import TeamDto
 from ..util.response import response_message, EINVAL, ENOENT, SUCCESS, EEXIST, EPERM, USER_NOT_EXIST, TOKEN_REQUIRED, TOKEN_ILLEGAL
 from ..config import get_config
@@ -101,6 +101,7 @@ class TeamList(Resource):
         user.save()
         organization.teams.append(team)
         organization.save()
+        invalidate_identity()
 
         team.path = name + '#' + str(team.id)
         team_root = USERS_ROOT / organization.path / team.path
@@ -155,8 +156,10 @@ class TeamList(Resource):
                 TestResult.objects(task=task).delete()
             tasks.delete()
         tests.delete()
+        TaskStat.objects(team=team).delete()
         TaskQueue.objects(team=team).update(to_delete=True, organization=None, team=None)
         team.delete()
+        invalidate_identity()
 
 @api.route('/avatar/<team_id>')
 class TeamAvatar(Resource):
@@ -208,6 +211,7 @@ class TeamMember(Resource):
                 return response_message(EPERM, "Can't quit the team as you are the owner"), 403
             team.modify(pull__members=user)
             user.modify(pull__teams=team)
+            invalidate_identity()
             return response_message(SUCCESS)
         else:
             return response_message(EINVAL, "User is not in the team"), 400
@@ -258,6 +262,7 @@ class TeamJoin(Resource):
             team.modify(push__members=user)
         if team not in user.teams:
             user.modify(push__teams=team)
+        invalidate_identity()
 
 @api.route('/users')
 class OrganizationUsers(Resource):
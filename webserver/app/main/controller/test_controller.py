@@ -7,15 +7,18 @@ from setuptools import sandbox
 from contextlib import redirect_stdout
 from io import StringIO
 
-from flask import send_from_directory, request, current_app
+from flask import send_file, send_from_directory, request, current_app, Response
 from flask_restx import Resource
 
 from ..util.decorator import token_required, organization_team_required_by_args
-from ..util.get_path import get_test_result_path, get_back_scripts_root, get_test_store_root
+from ..util.get_path import get_test_result_path, get_back_scripts_root, get_test_store_root, get_bundles_root
 from task_runner.util.dbhelper import find_dependencies, find_pkg_dependencies, find_local_dependencies, generate_setup, query_package, repack_package
 from ..config import get_config
 from ..model.database import Task, Test, Package
 from ..util.dto import TestDto
+from ..util.prefetch import prefetch_references
+from ..util import js2python_bool
+from ..util.bundle_cache import get_bundle_build_dir, get_bundle_key, get_bundle_manifest, get_cached_bundle, open_bundle_file, save_bundle
 from ..util.tarball import pack_files, make_tarfile, make_tarfile_from_dir
 from ..util.response import response_message, EINVAL, ENOENT, SUCCESS, EIO, EMFILE
 
@@ -32,6 +35,8 @@ class ScriptDownload(Resource):
     @api.doc('get_test_script')
     @api.param('id', description='The task id')
     @api.param('test', description='The test suite name')
+    @api.param('manifest', description='Return the {file: sha256} manifest of the bundle instead of the bundle')
+    @api.param('egg', description='Return only this file of the bundle')
     def get(self):
         """
         Get the test script
@@ -52,7 +57,6 @@ class ScriptDownload(Resource):
 
         test_path = None if '/' not in test_script else test_script.split('/', 1)[0]
 
-        result_dir = get_test_result_path(task)
         scripts_root = get_back_scripts_root(task)
         pypi_root = get_test_store_root(task=task)
         package = None
@@ -66,31 +70,59 @@ class ScriptDownload(Resource):
         elif test_path:
             package = query_package(test_path, task.organization, task.team, 'Test Suite')
 
+        bundles_root = get_bundles_root(task)
         if not package:
-            with tempfile.TemporaryDirectory(dir=result_dir) as tempDir:
-                test_script_name = os.path.splitext(test_script)[0].split('/', 1)[0]
-                deps = find_local_dependencies(scripts_root, test_script, task.organization, task.team)
-                generate_setup(scripts_root, tempDir, deps, test_script_name, '0.0.1')
-                with StringIO() as buf, redirect_stdout(buf):
-                    sandbox.run_setup(os.path.join(tempDir, 'setup.py'), ['bdist_egg'])
-                deps = find_dependencies(script_file, task.organization, task.team, 'Test Suite')
-                dist = os.path.join(tempDir, 'dist')
-                for pkg, version in deps:
-                    shutil.copy(pypi_root / pkg.package_name / pkg.get_package_by_version(version), dist)
-                make_tarfile_from_dir(os.path.join(result_dir, f'{test_script_name}.tar.gz'), dist)
-                return send_from_directory(Path(os.getcwd()) / result_dir, f'{test_script_name}.tar.gz')
+            key = get_bundle_key((scripts_root, pypi_root), test_script)
         else:
-            with tempfile.TemporaryDirectory(dir=result_dir) as tempDir:
-                dist = os.path.join(tempDir, 'dist')
-                os.mkdir(dist)
-                deps = find_pkg_dependencies(pypi_root, package, task.test.package_version, task.organization, task.team, 'Test Suite')
-                for pkg, version in deps:
-                    shutil.copy(pypi_root / pkg.package_name / pkg.get_package_by_version(version), dist)
-                if package.modified:
-                    pack_file = repack_package(pypi_root, scripts_root, package, task.test.package_version, tempDir)
-                    shutil.copy(pack_file, dist)
-                make_tarfile_from_dir(os.path.join(result_dir, f'{os.path.basename(test_script)}.tar.gz'), dist)
-                return send_from_directory(Path(os.getcwd()) / result_dir, f'{os.path.basename(test_script)}.tar.gz')
+            key = get_bundle_key((scripts_root, pypi_root), test_script, package.id, task.test.package_version)
+        if request.if_none_match.contains(key):
+            response = Response(status=304)
+            response.set_etag(key)
+            return response
+
+        bundle = get_cached_bundle(bundles_root, key)
+        if not bundle:
+            build_dir = get_bundle_build_dir(bundles_root)
+            if not package:
+                with tempfile.TemporaryDirectory(dir=build_dir) as tempDir:
+                    test_script_name = os.path.splitext(test_script)[0].split('/', 1)[0]
+                    deps = find_local_dependencies(scripts_root, test_script, task.organization, task.team)
+                    generate_setup(scripts_root, tempDir, deps, test_script_name, '0.0.1')
+                    with StringIO() as buf, redirect_stdout(buf):
+                        sandbox.run_setup(os.path.join(tempDir, 'setup.py'), ['bdist_egg'])
+                    deps = find_dependencies(script_file, task.organization, task.team, 'Test Suite')
+                    dist = os.path.join(tempDir, 'dist')
+                    for pkg, version in deps:
+                        shutil.copy(pypi_root / pkg.package_name / pkg.get_package_by_version(version), dist)
+                    tarball = make_tarfile_from_dir(os.path.join(tempDir, f'{test_script_name}.tar.gz'), dist, get_config().TARBALL_COMPRESS_LEVEL)
+                    bundle = save_bundle(bundles_root, key, tarball, dist)
+            else:
+                with tempfile.TemporaryDirectory(dir=build_dir) as tempDir:
+                    dist = os.path.join(tempDir, 'dist')
+                    os.mkdir(dist)
+                    deps = find_pkg_dependencies(pypi_root, package, task.test.package_version, task.organization, task.team, 'Test Suite')
+                    for pkg, version in deps:
+                        shutil.copy(pypi_root / pkg.package_name / pkg.get_package_by_version(version), dist)
+                    if package.modified:
+                        pack_file = repack_package(pypi_root, scripts_root, package, task.test.package_version, tempDir)
+                        shutil.copy(pack_file, dist)
+                    tarball = make_tarfile_from_dir(os.path.join(tempDir, f'{os.path.basename(test_script)}.tar.gz'), dist, get_config().TARBALL_COMPRESS_LEVEL)
+                    bundle = save_bundle(bundles_root, key, tarball, dist)
+
+        egg = request.args.get('egg', None)
+        if egg:
+            f = open_bundle_file(bundle, egg)
+            if f is None:
+                return response_message(ENOENT, 'File {} not found in the bundle'.format(egg)), 404
+            return send_file(f, mimetype='application/octet-stream', add_etags=False)
+
+        if js2python_bool(request.args.get('manifest', False)):
+            return {'etag': key, 'eggs': get_bundle_manifest(bundle)}, 200, {'ETag': '"{}"'.format(key)}
+
+        # an open file is still readable even if the bundle is pruned meanwhile
+        response = send_file(open(Path(os.getcwd()) / bundle, 'rb'), mimetype='application/gzip', add_etags=False)
+        response.set_etag(key)
+        return response
 
 @api.route('/<test_suite>')
 @api.param('test_suite', 'The test suite to query')
@@ -125,10 +157,10 @@ class TestSuitesList(Resource):
         organization = kwargs['organization']
         team = kwargs['team']
         
-        tests = Test.objects(organization=organization, team=team)
+        tests = Test.objects(organization=organization, team=team, staled__ne=True)
 
         ret = []
-        for t in tests:
+        for t in prefetch_references(tests, 'author', only=('name',)):
             if t.staled:
                 continue
             ret.append({
@@ -7,13 +7,13 @@ from pathlib import Path
 from bson.objectid import ObjectId
 from flask import request, send_from_directory, url_for, current_app
 from flask_restx import Resource
-from mongoengine import DoesNotExist, ValidationError
+from mongoengine import DoesNotExist, Q, ValidationError
 
 from ..util.decorator import token_required, organization_team_required_by_args, organization_team_required_by_json
-from ..util.get_path import get_test_results_root
 from ..config import get_config
 from ..model.database import QUEUE_PRIORITY_MAX, QUEUE_PRIORITY_MIN, Endpoint, Task, TestResult
 from ..util.dto import TestResultDto
+from ..util.prefetch import prefetch_references
 from ..util.response import response_message, ENOENT, EINVAL, SUCCESS, EPERM
 
 api = TestResultDto.api
@@ -22,6 +22,8 @@ _record_test_result = TestResultDto.record_test_result
 _test_result = TestResultDto.test_result
 
 USERS_ROOT = Path(get_config().USERS_ROOT)
+REPORT_FIELDS = ('test_suite', 'testcases', 'comment', 'priority', 'run_date', 'tester', 'status',
+                 'variables', 'endpoint_list', 'parallelization')
 
 
 @api.route('/')
@@ -35,6 +37,7 @@ class TestResultRoot(Resource):
     @api.param('priority', description='The priority of the task')
     @api.param('endpoint', description='The endpoint that runs the test')
     @api.param('sort', default='-run_date', description='The sort field')
+    @api.param('after', description='The last task ID of the previous page, used instead of page when sorting by run_date, the total is null then')
     @api.param('start_date', description='The start date')
     @api.param('end_date', description='The end date')
     @api.marshal_list_with(_test_report)
@@ -46,6 +49,7 @@ class TestResultRoot(Resource):
         priority = request.args.get('priority', default=None)
         endpoint_uid = request.args.get('endpoint', default=None)
         sort = request.args.get('sort', default='-run_date')
+        after = request.args.get('after', default=None)
         start_date = request.args.get('start_date', None)
         end_date = request.args.get('end_date', None)
 
@@ -87,22 +91,30 @@ class TestResultRoot(Resource):
                 return response_message(EINVAL, 'Endpoint not found'), 400
             query['endpoint_run'] = endpoint
 
-        try:
-            dirs = os.listdir(get_test_results_root(team=team, organization=organization))
-        except FileNotFoundError:
-            return {'items': [], 'total': 0}
-        ret = []
-        for d in dirs:
-            try:
-                ObjectId(d)
-            except ValidationError as e:
-                current_app.logger.exception(e)
+        query['has_results'] = True
+        all_tasks = Task.objects(**query).only(*REPORT_FIELDS)
+        keyset = after and sort in ('run_date', '-run_date')
+        if keyset and not ObjectId.is_valid(after):
+            return response_message(EINVAL, 'Invalid task ID {}'.format(after)), 400
+        # the total isn't counted with keyset pagination, the pager should keep the total of the first page
+        total = all_tasks.count() if not keyset else None
+
+        if keyset:
+            # keyset pagination, continue from the last task of the previous page
+            last = Task.objects(pk=after).only('run_date').first()
+            if not last:
+                return response_message(EINVAL, 'Task {} not found'.format(after)), 400
+            if sort == '-run_date':
+                all_tasks = all_tasks.filter(Q(run_date__lt=last.run_date) | Q(run_date=last.run_date, pk__lt=last.pk))
+                all_tasks = all_tasks.order_by('-run_date', '-id')[:limit]
             else:
-                ret.append(d)
+                all_tasks = all_tasks.filter(Q(run_date__gt=last.run_date) | Q(run_date=last.run_date, pk__gt=last.pk))
+                all_tasks = all_tasks.order_by('run_date', 'id')[:limit]
+        else:
+            all_tasks = all_tasks.order_by(sort, '-id' if sort.startswith('-') else 'id')[(page - 1) * limit : page * limit]
 
-        all_tasks = Task.objects(id__in=ret, **query).order_by(sort)
         ret = []
-        for t in all_tasks[(page - 1) * limit : page * limit]:
+        for t in prefetch_references(all_tasks, 'tester', only=('name',)):
             ret.append({
                 'id': str(t.id),
                 'test_suite': t.test_suite,
@@ -117,7 +129,7 @@ class TestResultRoot(Resource):
                 'parallelization': t.parallelization
             })
 
-        return {'items': ret, 'total': all_tasks.count()}
+        return {'items': ret, 'total': total}
 
     # @token_required
     @api.doc('record_the_test_case')
@@ -16,6 +16,7 @@ from ..util.get_path import get_test_store_root, is_path_secure, get_user_script
 from task_runner.util.dbhelper import get_package_info, get_package_requires, install_test_suite, get_internal_packages
 from ..config import get_config
 from ..model.database import Package, Test
+from ..util.bundle_cache import invalidate_tree_digest
 from ..util.dto import StoreDto
 from ..util.tarball import path_to_dict
 from ..util.response import response_message, ENOENT, EINVAL, SUCCESS, EIO, EPERM
@@ -151,6 +152,7 @@ class PackageManagement(Resource):
                     pass
                 package.py_packages = get_internal_packages(filename)
                 shutil.move(filename, pypi_root / package.package_name / file.filename)
+                invalidate_tree_digest(pypi_root)
                 package.uploader = user
                 package.upload_date = datetime.datetime.utcnow
                 package.description = description
@@ -216,6 +218,7 @@ class PackageManagement(Resource):
             except FileNotFoundError:
                 pass
             package.delete()
+        invalidate_tree_digest(pypi_root)
 
         return response_message(SUCCESS)
 
@@ -372,6 +375,7 @@ class PackageInfo(Resource):
                 shutil.rmtree(scripts_root / pkg_name)
             if os.path.exists(libraries_root / pkg_name):
                 shutil.rmtree(libraries_root / pkg_name)
+        invalidate_tree_digest(libraries_root)
         for pkg_name in pkg_names:
             for script in os.listdir(scripts_root / pkg_name):
                 test = Test.objects(test_suite=os.path.splitext(script)[0], path=pkg_name).first()
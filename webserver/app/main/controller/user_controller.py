@@ -5,9 +5,9 @@ from flask import request, send_from_directory
 from flask_restx import Resource
 from mongoengine import ValidationError
 
-from ..service.auth_helper import Auth
+from ..service.auth_helper import Auth, invalidate_identity
 from ..util.decorator import admin_token_required, token_required
-from ..model.database import User, Test, TestResult, TaskQueue, Task, Organization, Team
+from ..model.database import User, Test, TestResult, TaskQueue, TaskStat, Task, Organization, Team
 
 from ..service.user_service import get_all_users, save_new_user
 from ..service.auth_helper import Auth
@@ -176,6 +176,7 @@ class UserAccount(Resource):
             user.save()
         except ValidationError:
             return response_message(EINVAL, 'Failed to update the user account'), 401
+        invalidate_identity(user)
 
     @api.doc('delete_user_account')
     @api.expect(_password)
@@ -227,6 +228,7 @@ class UserAccount(Resource):
                     TestResult.objects(task=task).delete()
                 tasks.delete()
             tests.delete()
+            TaskStat.objects(organization=org).delete()
             TaskQueue.objects(organization=org).update(to_delete=True, organization=None, team=None)
             org.delete()
 
@@ -235,6 +237,7 @@ class UserAccount(Resource):
             team.delete()
 
         user.delete()
+        invalidate_identity()
 
         auth_header = request.headers.get('X-Token')
         return Auth.logout_user(data=auth_header)
@@ -1,9 +1,13 @@
 import datetime
-import time
+import hashlib
 import jwt
 import re
+import threading
+import time
 
+from bson import DBRef
 from flask import current_app
+from pymongo import ReturnDocument
 from .. import flask_bcrypt
 from ..config import key
 from mongoengine import Document, StringField, EmailField, ListField, ReferenceField, DateTimeField, DictField, URLField, BooleanField, IntField, UUIDField, FloatField
@@ -14,6 +18,10 @@ QUEUE_PRIORITY_DEFAULT = 2
 QUEUE_PRIORITY_MAX = 3
 QUEUE_PRIORITY = (QUEUE_PRIORITY_MAX, QUEUE_PRIORITY_DEFAULT, QUEUE_PRIORITY_MIN)
 
+BLACKLIST_REFRESH_INTERVAL = 5  # seconds before the tokens blacklisted by the other processes are loaded
+BLACKLIST_CLOCK_SKEW = 60       # seconds the refresh queries overlap
+BLACKLIST_RELOAD_INTERVAL = 3600  # seconds before the cache is rebuilt from the collection, dropping the expired tokens
+
 EVENT_CODE_START_TASK = 200
 EVENT_CODE_CANCEL_TASK = 201
 EVENT_CODE_UPDATE_USER_SCRIPT = 202
@@ -23,8 +31,6 @@ EVENT_CODE_TASKQUEUE_DELETE = 205
 EVENT_CODE_EXIT_EVENT_TASK = 206
 EVENT_CODE_DELETE_ENDPOINT = 207
 
-LOCK_TIMEOUT = 50
-
 class IPAddressField(StringField):
     """A field that validates input as an IP address, may including port.
     """
@@ -145,23 +151,120 @@ class BlacklistToken(Document):
     """
     token = StringField(max_length=500, required=True, unique=True)
     blacklisted_on = DateTimeField(default=datetime.datetime.utcnow)
-
-    meta = {'collection': 'blacklist_tokens'}
+    expires = DateTimeField()   # when the token expires, the TTL index removes the document after that
+
+    meta = {
+        'collection': 'blacklist_tokens',
+        'indexes': [
+            {'fields': ['expires'], 'expireAfterSeconds': 0},
+            'blacklisted_on'
+        ]
+    }
+
+    _cache = None           # HashSet of the blacklisted tokens' digests
+    _cache_since = None     # the tokens blacklisted since then are still to be loaded into the cache
+    _cache_refreshed = 0    # time.monotonic() of the last refresh
+    _cache_loaded = 0       # time.monotonic() of the last load
+    _cache_lock = threading.Lock()
 
     def __repr__(self):
         return '<id: token: {}'.format(self.token)
 
     @staticmethod
-    def check_blacklist(auth_token):
-        # check whether auth token has been blacklisted
+    def hash_token(auth_token):
+        return hashlib.sha256(str(auth_token).encode('utf-8')).digest()
+
+    @staticmethod
+    def _load_digests(now):
+        """
+        The digests of the tokens unexpired at now, the tokens blacklisted without the expiration time
+        get it from their payloads
+        """
+        digests = []
+        for token in BlacklistToken.objects(expires__not__lte=now).only('token', 'expires'):
+            if not token.expires:
+                try:
+                    payload = jwt.decode(token.token, verify=False)
+                    token.modify(expires=datetime.datetime.utcfromtimestamp(payload['exp']))
+                except (jwt.InvalidTokenError, KeyError):
+                    pass
+            digests.append(BlacklistToken.hash_token(token.token))
+        return digests
+
+    @staticmethod
+    def load_cache():
+        """
+        Load the unexpired blacklisted tokens into the in-process cache
+        """
+        from ..util.bloomfilter import HashSet
+
+        now = datetime.datetime.utcnow()
+        cache = HashSet(BlacklistToken._load_digests(now))
+        with BlacklistToken._cache_lock:
+            BlacklistToken._cache = cache
+            BlacklistToken._cache_since = now
+            BlacklistToken._cache_refreshed = BlacklistToken._cache_loaded = time.monotonic()
+        return cache
+
+    @staticmethod
+    def reload_cache():
+        """
+        Rebuild the cache from the collection, so the tokens expired meanwhile no longer take memory
+
+        Only one thread reloads at a time, the others go on with the current cache.
+        """
+        from ..util.bloomfilter import HashSet
+
+        if not BlacklistToken._cache_lock.acquire(blocking=False):
+            return
         try:
-            res = BlacklistToken.objects(token=str(auth_token)).get()
-        except BlacklistToken.DoesNotExist:
+            now = datetime.datetime.utcnow()
+            BlacklistToken._cache = HashSet(BlacklistToken._load_digests(now))
+            BlacklistToken._cache_since = now
+            BlacklistToken._cache_refreshed = BlacklistToken._cache_loaded = time.monotonic()
+        finally:
+            BlacklistToken._cache_lock.release()
+
+    @staticmethod
+    def refresh_cache():
+        """
+        Load the tokens blacklisted by the other processes since the last refresh
+
+        The query overlaps the last one by BLACKLIST_CLOCK_SKEW in case the clocks of the processes differ.
+        Only one thread refreshes at a time, the others go on with the current cache.
+        """
+        if not BlacklistToken._cache_lock.acquire(blocking=False):
+            return
+        try:
+            now = datetime.datetime.utcnow()
+            since = BlacklistToken._cache_since - datetime.timedelta(seconds=BLACKLIST_CLOCK_SKEW)
+            for token in BlacklistToken.objects(blacklisted_on__gte=since).only('token'):
+                BlacklistToken._cache.add(BlacklistToken.hash_token(token.token))
+            BlacklistToken._cache_since = now
+            BlacklistToken._cache_refreshed = time.monotonic()
+        finally:
+            BlacklistToken._cache_lock.release()
+
+    @staticmethod
+    def add_to_cache(auth_token):
+        BlacklistToken.get_cache().add(BlacklistToken.hash_token(auth_token))
+
+    @staticmethod
+    def get_cache():
+        if BlacklistToken._cache is None:
+            return BlacklistToken.load_cache()
+        if time.monotonic() - BlacklistToken._cache_loaded > BLACKLIST_RELOAD_INTERVAL:
+            BlacklistToken.reload_cache()
+        elif time.monotonic() - BlacklistToken._cache_refreshed > BLACKLIST_REFRESH_INTERVAL:
+            BlacklistToken.refresh_cache()
+        return BlacklistToken._cache
+
+    @staticmethod
+    def check_blacklist(auth_token):
+        # the cache answers the negatives, the positives are confirmed by the database
+        if BlacklistToken.hash_token(auth_token) not in BlacklistToken.get_cache():
             return False
-        except BlacklistToken.MultipleObjectsReturned:
-            return True
-        else:
-            return True
+        return BlacklistToken.objects(token=str(auth_token)).count() > 0
 
 class Test(Document):
     schema_version = StringField(max_length=10, default='1')
@@ -177,8 +280,57 @@ class Test(Document):
     staled = BooleanField(default=False)
     package = ReferenceField('Package')
     package_version = StringField()
+    md_hash = StringField()     # sha1 of the markdown file the test cases and variables were extracted from
+
+    meta = {
+        'collection': 'tests',
+        'indexes': [
+            {'fields': ('test_suite', 'path', 'organization', 'team'), 'unique': True},  # the key of the bulk upserts
+            ('organization', 'team'),
+        ]
+    }
+
+    UNIQUE_KEY = ('test_suite', 'path', 'organization', 'team')
+
+    @classmethod
+    def drop_duplicates(cls):
+        """
+        Remove the duplicated test suites allowed by the old non-unique index and drop that index,
+        needed once before the unique index can be built
 
-    meta = {'collection': 'tests'}
+        The most recently updated one of the duplicates is kept, the tasks and endpoints referring
+        to the others are moved to it. Return the number of test suites removed.
+        """
+        # not _get_collection(), which would fail to build the unique index over the old one
+        collection = cls._get_db()[cls._get_collection_name()]
+        key = [(field, 1) for field in cls.UNIQUE_KEY]
+        old_indexes = [name for name, index in collection.index_information().items()
+                       if index['key'] == key and not index.get('unique', False)]
+        if not old_indexes:
+            return 0
+
+        pipeline = [
+            {'$sort': {'update_date': -1, '_id': -1}},
+            {'$group': {
+                # a missing field is a null for the unique index
+                '_id': {field: {'$ifNull': ['$' + field, None]} for field in cls.UNIQUE_KEY},
+                'ids': {'$push': '$_id'},
+                'count': {'$sum': 1}
+            }},
+            {'$match': {'count': {'$gt': 1}}}
+        ]
+        tasks = Task._get_collection()
+        endpoints = Endpoint._get_collection()
+        removed = 0
+        for group in collection.aggregate(pipeline, allowDiskUse=True):
+            keep, duplicates = group['ids'][0], group['ids'][1:]
+            tasks.update_many({'test': {'$in': duplicates}}, {'$set': {'test': keep}})
+            endpoints.update_many({'tests': {'$in': duplicates}}, {'$addToSet': {'tests': keep}})
+            endpoints.update_many({'tests': {'$in': duplicates}}, {'$pull': {'tests': {'$in': duplicates}}})
+            removed += collection.delete_many({'_id': {'$in': duplicates}}).deleted_count
+        for name in old_indexes:
+            collection.drop_index(name)
+        return removed
 
     def __eq__(self, other):
         for item in self:
@@ -208,10 +360,114 @@ class Task(Document):
     tester = ReferenceField(User)
     upload_dir = StringField(max_length=100)
     test_results = ListField(ReferenceField('TestResult'))
+    has_results = BooleanField(default=False)  # the test result directory has been created
+    stat_counted = StringField(max_length=10)  # the TaskStat field the task has been counted into
     organization = ReferenceField(Organization) # embedded document from Test
     team = ReferenceField(Team) # embedded document from Test
 
-    meta = {'collection': 'tasks'}
+    meta = {
+        'collection': 'tasks',
+        'indexes': [
+            ('organization', 'team', 'status', 'run_date'),                # task statistics
+            ('organization', 'team', 'status', 'schedule_date'),           # task statistics of the waiting tasks
+            ('organization', 'team', 'has_results', '-run_date', '-id'),  # test report list
+            'test',
+        ]
+    }
+
+class TaskStat(Document):
+    '''
+    Daily rollup of the finished tasks, a day is the UTC day of the tasks' run date
+    '''
+    schema_version = StringField(max_length=10, default='1')
+    date = DateTimeField(required=True)
+    organization = ReferenceField(Organization)
+    team = ReferenceField(Team)
+    succeeded = IntField(min_value=0, default=0)
+    failed = IntField(min_value=0, default=0)
+
+    meta = {
+        'collection': 'task_stats',
+        'indexes': [{'fields': ('organization', 'team', 'date'), 'unique': True}]
+    }
+
+    FIELDS = {'successful': 'succeeded', 'failed': 'failed'}
+
+    @classmethod
+    def count_task(cls, task):
+        """
+        Count a finished task into the rollup of its run date
+
+        A parallelized task finishes once per endpoint, it's counted only once with its latest status,
+        the same as the rebuild counts it.
+        """
+        field = cls.FIELDS.get(task.status, None)
+        if not field or not task.run_date:
+            return
+        old = Task.objects(pk=task.pk, stat_counted__ne=field).modify(set__stat_counted=field)
+        if not old:
+            return
+        inc = {'inc__' + field: 1}
+        if old.stat_counted:
+            inc['dec__' + old.stat_counted] = 1
+        date = datetime.datetime.combine(task.run_date.date(), datetime.time())
+        cls.objects(organization=task.organization, team=task.team, date=date).update_one(upsert=True, **inc)
+
+    @classmethod
+    def discount_task(cls, task):
+        """
+        Take a task out of the rollup before it's deleted
+        """
+        old = Task.objects(pk=task.pk, stat_counted__ne=None).modify(unset__stat_counted=True)
+        if not old or not old.run_date:
+            return
+        date = datetime.datetime.combine(old.run_date.date(), datetime.time())
+        cls.objects(organization=old.organization, team=old.team, date=date).update_one(**{'dec__' + old.stat_counted: 1})
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Rebuild the rollup from the tasks collection in one aggregation
+
+        The rollup is built into a temporary collection which then replaces the current one by renaming,
+        so the statistics never show a partial rollup.
+        """
+        tasks = Task._get_collection()
+        for status, field in cls.FIELDS.items():
+            tasks.update_many({'status': status, 'run_date': {'$ne': None}}, {'$set': {'stat_counted': field}})
+        pipeline = [
+            {'$match': {'status': {'$in': list(cls.FIELDS)}, 'run_date': {'$ne': None}}},
+            {'$group': {
+                '_id': {
+                    'organization': '$organization',
+                    'team': '$team',
+                    'date': {'$dateFromParts': {
+                        'year': {'$year': '$run_date'},
+                        'month': {'$month': '$run_date'},
+                        'day': {'$dayOfMonth': '$run_date'}}}
+                },
+                'succeeded': {'$sum': {'$cond': [{'$eq': ['$status', 'successful']}, 1, 0]}},
+                'failed': {'$sum': {'$cond': [{'$eq': ['$status', 'failed']}, 1, 0]}}
+            }},
+            {'$project': {
+                '_id': False,
+                'schema_version': {'$literal': '1'},
+                'organization': '$_id.organization',
+                'team': '$_id.team',
+                'date': '$_id.date',
+                'succeeded': True,
+                'failed': True
+            }}
+        ]
+        stats = list(tasks.aggregate(pipeline, allowDiskUse=True))
+        collection = cls._get_collection()
+        temp = collection.database[collection.name + '_rebuild']
+        temp.drop()
+        temp.create_index([('organization', 1), ('team', 1), ('date', 1)], unique=True)
+        if stats:
+            temp.insert_many(stats)
+        temp.rename(collection.name, dropTarget=True)
+        return len(stats)
 
 class Endpoint(Document):
     schema_version = StringField(max_length=10, default='1')
@@ -224,7 +480,13 @@ class Endpoint(Document):
     team = ReferenceField(Team)
     uid = UUIDField(binary=False)
 
-    meta = {'collection': 'endpoints'}
+    meta = {
+        'collection': 'endpoints',
+        'indexes': [
+            ('uid', 'organization', 'team'),
+            ('organization', 'team'),
+        ]
+    }
 
 class TaskQueue(Document):
     '''
@@ -235,50 +497,82 @@ class TaskQueue(Document):
     tasks = ListField(ReferenceField(Task))
     endpoint = ReferenceField(Endpoint)
     running_task = ReferenceField(Task)
-    rw_lock = BooleanField(default=False)
+    rw_lock = BooleanField(default=False)  # deprecated, kept for the existing documents
     organization = ReferenceField(Organization)
     team = ReferenceField(Team)
     to_delete = BooleanField(default=False)
 
-    meta = {'collection': 'task_queues'}
+    meta = {
+        'collection': 'task_queues',
+        'indexes': [('organization', 'team', 'endpoint', '-priority')]
+    }
 
-    def acquire_lock(self):
-        for i in range(LOCK_TIMEOUT):
-            ret = self.modify({'rw_lock': False}, rw_lock=True)
-            if ret:
-                return True
-            time.sleep(0.1)
-        else:
-            return False
-
-    def release_lock(self):
-        self.modify(rw_lock=False)
+    @staticmethod
+    def _pop_head(collection, query, sort=None):
+        """
+        Dequeue the head task of the queue matching the query and mark it as the running task in one atomic operation
+        Return the raw queue document before the update
+        """
+        tasks = {'$ifNull': ['$tasks', []]}
+        return collection.find_one_and_update(
+            query,
+            [{'$set': {
+                'running_task': {'$ifNull': [{'$arrayElemAt': [tasks, 0]}, None]},
+                'tasks': {'$slice': [tasks, 1, {'$max': [{'$size': tasks}, 1]}]}
+            }}],
+            sort=sort,
+            projection={'tasks': {'$slice': 1}},
+            return_document=ReturnDocument.BEFORE)
 
-    def pop(self):
-        if not self.acquire_lock():
+    @staticmethod
+    def _deref_head(queue):
+        if not queue or not queue.get('tasks'):
             return None
-        if 'tasks' not in self or len(self.tasks) == 0:
-            task = None
-        else:
-            task = self.tasks[0]
-        self.modify(pop__tasks=-1)
-        self.modify(running_task=task)
-        self.release_lock()
+        task_id = queue['tasks'][0]
+        task = Task.objects(pk=task_id).first()
+        if not task:
+            return DBRef(Task._get_collection_name(), task_id)
         return task
 
+    @classmethod
+    def pop_highest(cls, endpoint, organization=None, team=None):
+        """
+        Dequeue the head task from the highest priority non-empty queue of the endpoint in one atomic operation
+        Return the task queue and the task, or (None, None) if all queues are empty
+        """
+        query = cls.objects(endpoint=endpoint, organization=organization, team=team)._query
+        query['tasks.0'] = {'$exists': True}
+        queue = cls._pop_head(cls._get_collection(), query, sort=[('priority', -1)])
+        if not queue:
+            return None, None
+        return cls.objects(pk=queue['_id']).first(), cls._deref_head(queue)
+
+    def pop(self):
+        """
+        Dequeue the head task and mark it as the running task in one atomic operation
+        The running task is reset to None if the queue is empty
+        """
+        return self._deref_head(self._pop_head(self._get_collection(), {'_id': self.pk}))
+
     def push(self, task):
         return self.modify(push__tasks=task)
     
     def flush(self, cancelled=False):
-        if not self.acquire_lock():
-            return False
+        """
+        Empty the queue atomically, return the flushed tasks or None if the queue doesn't exist
+        """
+        queue = self._get_collection().find_one_and_update(
+            {'_id': self.pk},
+            {'$set': {'tasks': []}},
+            projection={'tasks': True},
+            return_document=ReturnDocument.BEFORE)
+        if queue is None:
+            return None
+        tasks = Task.objects(pk__in=queue.get('tasks', []))
         if cancelled:
-            for task in self.tasks:
-                task.update(status='cancelled')
+            tasks.update(status='cancelled')
         self.tasks = []
-        self.save()
-        self.release_lock()
-        return True
+        return list(tasks)
 
 class TestResult(Document):
     schema_version = StringField(max_length=10, default='1')
@@ -291,7 +585,10 @@ class TestResult(Document):
     status = StringField(max_length=10, default='FAIL')
     more_result = DictField()
 
-    meta = {'collection': 'test_results'}
+    meta = {
+        'collection': 'test_results',
+        'indexes': ['task']
+    }
 
 class Event(Document):
     schema_version = StringField(max_length=10, default='1')
@@ -307,46 +604,46 @@ class Event(Document):
 class EventQueue(Document):
     schema_version = StringField(max_length=10, default='1')
     events = ListField(ReferenceField(Event))
-    rw_lock = BooleanField(default=False)
+    rw_lock = BooleanField(default=False)  # deprecated, kept for the existing documents
 
     meta = {'collection': 'event_queues'}
 
-    def acquire_lock(self):
-        for i in range(LOCK_TIMEOUT):
-            ret = self.modify({'rw_lock': False}, rw_lock=True)
-            if ret:
-                return True
-            time.sleep(0.1)
-        else:
-            return False
-
-    def release_lock(self):
-        self.modify(rw_lock=False)
-
     def pop(self):
-        if not self.acquire_lock():
+        """
+        Dequeue the head event in one atomic operation
+        """
+        queue = self._get_collection().find_one_and_update(
+            {'_id': self.pk},
+            {'$pop': {'events': -1}},
+            projection={'events': {'$slice': 1}},
+            return_document=ReturnDocument.BEFORE)
+        if not queue or not queue.get('events'):
             return None
-        if 'events' not in self or len(self.events) == 0:
-            event = None
-        else:
-            event = self.events[0]
-        self.modify(pop__events=-1)
-        self.release_lock()
+        event_id = queue['events'][0]
+        event = Event.objects(pk=event_id).first()
+        if not event:
+            return DBRef(Event._get_collection_name(), event_id)
         return event
 
     def push(self, event):
         return self.modify(push__events=event)
     
     def flush(self, cancelled=False):
-        if not self.acquire_lock():
-            return False
+        """
+        Empty the queue atomically, return the flushed events or None if the queue doesn't exist
+        """
+        queue = self._get_collection().find_one_and_update(
+            {'_id': self.pk},
+            {'$set': {'events': []}},
+            projection={'events': True},
+            return_document=ReturnDocument.BEFORE)
+        if queue is None:
+            return None
+        events = Event.objects(pk__in=queue.get('events', []))
         if cancelled:
-            for event in self.events:
-                event.update(status='Cancelled')
+            events.update(status='Cancelled')
         self.events = []
-        self.save()
-        self.release_lock()
-        return True
+        return list(events)
 
 
 class Package(Document):
@@ -370,7 +667,14 @@ class Package(Document):
 
     version_re = re.compile(r"^(?P<name>.+?)(-(?P<ver>\d.+?))-.*$").match
 
-    meta = {'collection': 'packages'}
+    meta = {
+        'collection': 'packages',
+        'indexes': [
+            ('py_packages', 'organization', 'team', 'package_type'),
+            ('name', 'proprietary', 'package_type'),
+            'files',
+        ]
+    }
 
     def get_package_by_version(self, version=None):
         if version is None and len(self.files) > 0:
@@ -1,8 +1,67 @@
-from app.main.model.database import User
-from flask import current_app
+import time
+
+from app.main.model.database import BlacklistToken, User
+from flask import current_app, g, has_app_context
+from ..util.ttlcache import TTLCache
 from ..service.blacklist_service import save_token
+from ..util.prefetch import reference_id
 from ..util.response import *
 
+AUTH_CACHE_TTL = 60  # seconds the signature of a token or a loaded identity is trusted, the blacklist is always checked
+
+VERIFIED_TOKENS = TTLCache(maxsize=4096, ttl=AUTH_CACHE_TTL)  # {token: (user id, expiration timestamp)}
+IDENTITIES = TTLCache(maxsize=4096, ttl=AUTH_CACHE_TTL)       # {user id: Identity}
+
+
+class Identity():
+    """
+    What the decorators need to know about a logged in user, the memberships are sets of ids
+
+    The documents of the user and of its organizations and teams are kept as raw data, every request gets
+    its own copy of them, so changing a document in a request doesn't change the cached one.
+    """
+    def __init__(self, son):
+        user = User._from_son(son)
+        self.user_id = str(user.id)
+        self.info = {
+            'user_id': str(user.id),
+            'email': user.email,
+            'username': user.name,
+            'roles': list(user.roles),
+            'registered_on': user.registered_on,
+            'avatar': user.avatar,
+            'introduction': user.introduction,
+            'region': user.region
+        }
+        self.organizations = {str(reference_id(o)) for o in user._data.get('organizations', None) or []}
+        self.teams = {str(reference_id(t)) for t in user._data.get('teams', None) or []}
+        self._sons = {(User, self.user_id): son}
+
+    def get_document(self, document, pk):
+        """
+        Get a copy of a document of the user, like its organizations and teams, None if it doesn't exist
+        """
+        key = (document, str(pk))
+        son = self._sons.get(key, None)
+        if son is None:
+            son = document.objects(pk=pk).as_pymongo().first()
+            if son is None:
+                return None
+            self._sons[key] = son
+        return document._from_son(son)
+
+def invalidate_identity(user=None):
+    """
+    Forget the cached identity of a user, or of all users if no user is given
+
+    Call it once a user is changed or deleted, or the memberships of the user have changed. Since the
+    organizations and teams are cached along with their members, forget all identities once one of them changes.
+    """
+    if user is None:
+        IDENTITIES.clear()
+    else:
+        IDENTITIES.pop(str(getattr(user, 'id', user)))
+
 
 class Auth:
 
@@ -30,30 +89,75 @@ class Auth:
             payload = User.decode_auth_token(auth_token)
             if not isinstance(payload, str):
                 # mark the token as blacklisted
-                return save_token(token=auth_token)
+                ret = save_token(token=auth_token)
+                VERIFIED_TOKENS.pop(auth_token)
+                return ret
             return response_message(TOKEN_ILLEGAL, payload), 401
         return response_message(TOKEN_REQUIRED), 401
 
+    @staticmethod
+    def verify_token(token):
+        """
+        Return the user id of the token and None, or None and why the token is invalid
+        """
+        cached = VERIFIED_TOKENS.get(token)
+        if cached and cached[1] > time.time():
+            # only the signature check is cached, a token may be blacklisted by another process at any time
+            if BlacklistToken.check_blacklist(token):
+                VERIFIED_TOKENS.pop(token)
+                return None, 'Token blacklisted. Please log in again.'
+            return cached[0], None
+        payload = User.decode_auth_token(token)
+        if isinstance(payload, str):
+            return None, payload
+        VERIFIED_TOKENS.set(token, (payload['sub'], payload['exp']))
+        return payload['sub'], None
+
+    @staticmethod
+    def get_identity(token):
+        """
+        Resolve the token to the identity of the logged in user, it's resolved only once in a request
+
+        Return the identity and None, or None and the error response.
+        """
+        if has_app_context() and token and g.get('identity_token', None) == token:
+            return g.identity, None
+        if not token:
+            return None, (response_message(TOKEN_REQUIRED), 401)
+
+        user_id, error = Auth.verify_token(token)
+        if error:
+            return None, (response_message(TOKEN_ILLEGAL, error), 401)
+
+        identity = IDENTITIES.get(user_id)
+        if not identity:
+            son = User.objects(pk=user_id).as_pymongo().first()
+            if not son:
+                return None, (response_message(USER_NOT_EXIST), 404)
+            identity = Identity(son)
+            IDENTITIES.set(user_id, identity)
+        if has_app_context():
+            g.identity_token = token
+            g.identity = identity
+        return identity, None
+
+    @staticmethod
+    def get_user(identity):
+        """
+        Get the User document of the identity, it's copied only once in a request
+        """
+        user = g.get('user', None)
+        if not user or str(user.id) != identity.user_id:
+            user = identity.get_document(User, identity.user_id)
+            g.user = user
+        return user
+
     @staticmethod
     def get_logged_in_user(token):
-        if token:
-            payload = User.decode_auth_token(token)
-            if not isinstance(payload, str):
-                user = User.objects(pk=payload['sub']).first()
-                if user:
-                    return response_message(SUCCESS,
-                            user_id=str(user.id),
-                            email=user.email,
-                            username=user.name,
-                            roles=user.roles,
-                            registered_on=user.registered_on,
-                            avatar=user.avatar,
-                            introduction=user.introduction,
-                            region=user.region
-                        ), 200
-                return response_message(USER_NOT_EXIST), 404
-            return response_message(TOKEN_ILLEGAL, payload), 401
-        return response_message(TOKEN_REQUIRED), 401
+        identity, error = Auth.get_identity(token)
+        if error:
+            return error
+        return response_message(SUCCESS, **dict(identity.info, roles=list(identity.info['roles']))), 200
 
     @staticmethod
     def is_user_authenticated(token):
@@ -1,4 +1,6 @@
+import datetime
 
+import jwt
 from app.main.model.database import BlacklistToken
 from flask import current_app
 
@@ -6,9 +8,15 @@ from ..util.response import *
 
 def save_token(token):
     blacklist_token = BlacklistToken(token=token)
+    try:
+        payload = jwt.decode(token, verify=False)
+        blacklist_token.expires = datetime.datetime.utcfromtimestamp(payload['exp'])
+    except (jwt.InvalidTokenError, KeyError):
+        pass
     try:
         # insert the token
         blacklist_token.save()
+        BlacklistToken.add_to_cache(token)
         return response_message(SUCCESS)
     except Exception as e:
         current_app.logger.exception(e)
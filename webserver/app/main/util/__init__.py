@@ -1,8 +1,12 @@
 import sys
+import threading
 from flask import current_app
 
 from ..model.database import *
 
+# set whenever an event is pushed so that the event loop can wake up immediately instead of polling
+EVENT_PUSHED = threading.Event()
+
 def push_event(organization, team, code, message=None):
     event = Event(organization=organization, team=team, code=code)
     if message:
@@ -17,6 +21,7 @@ def push_event(organization, team, code, message=None):
     if not eventqueue.push(event):
         current_app.logger.error('Failed to push the event')
         return False
+    EVENT_PUSHED.set()
     return True
 
 def get_room_id(*data):
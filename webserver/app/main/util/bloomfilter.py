@@ -0,0 +1,69 @@
+import bisect
+import math
+import threading
+
+
+class BloomFilter():
+    """
+    A fixed size bloom filter of hash digests, no false negatives and about error_rate false positives at capacity
+    """
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(1, capacity)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest):
+        # double hashing with two 64-bit halves of the digest, which needs to be at least 16 bytes
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:16], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, digest):
+        for pos in self._positions(digest):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, digest):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+class HashSet():
+    """
+    A set of hash digests, the bloom filter answers most negatives before a binary search of the sorted digests
+
+    The bloom filter is rebuilt with the doubled capacity once it's full. Thread-safe.
+    """
+    def __init__(self, digests=(), capacity=1024, error_rate=0.001):
+        self.error_rate = error_rate
+        self._digests = sorted(set(digests))
+        self._bloom = None
+        self._lock = threading.Lock()
+        self._rebuild(max(capacity, 2 * len(self._digests)))
+
+    def _rebuild(self, capacity):
+        # fill it before replacing the old one, so the readers never miss any digest
+        bloom = BloomFilter(capacity, self.error_rate)
+        for digest in self._digests:
+            bloom.add(digest)
+        self._bloom = bloom
+
+    def add(self, digest):
+        with self._lock:
+            index = bisect.bisect_left(self._digests, digest)
+            if index < len(self._digests) and self._digests[index] == digest:
+                return
+            self._digests.insert(index, digest)
+            if len(self._digests) > self._bloom.capacity:
+                self._rebuild(2 * self._bloom.capacity)
+            else:
+                self._bloom.add(digest)
+
+    def __contains__(self, digest):
+        bloom = self._bloom
+        if digest not in bloom:
+            return False
+        digests = self._digests
+        index = bisect.bisect_left(digests, digest)
+        return index < len(digests) and digests[index] == digest
+
+    def __len__(self):
+        return len(self._digests)
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+from .ttlcache import TTLCache
+
+BUNDLE_FORMAT = '1'     # bump it when the bundle layout changes to orphan the cached bundles
+BUNDLE_CACHE_SIZE = 32  # bundles kept in a bundle cache directory
+BUNDLE_GRACE_PERIOD = 600   # seconds a bundle is kept after its last use, no matter how many bundles are cached
+TREE_DIGEST_TTL = 60    # seconds a file tree digest is trusted, the writers in this process invalidate it at once
+
+TREE_DIGESTS = TTLCache(maxsize=1024, ttl=TREE_DIGEST_TTL)  # {root: sha1 of the file tree}
+
+
+def hash_tree(hasher, root):
+    """
+    Feed the relative paths, sizes and modification times of the files under the root to the hasher
+    """
+    root = str(root)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d != '__pycache__')
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            hasher.update('{}\0{}\0{}\n'.format(os.path.relpath(path, root), st.st_size, st.st_mtime_ns).encode('utf-8'))
+
+def get_tree_digest(root):
+    """
+    The digest of the file tree under the root, the tree is walked only if the digest isn't cached
+    """
+    root = str(root)
+    digest = TREE_DIGESTS.get(root)
+    if digest is None:
+        hasher = hashlib.sha1()
+        hash_tree(hasher, root)
+        digest = hasher.hexdigest()
+        TREE_DIGESTS.set(root, digest)
+    return digest
+
+def invalidate_tree_digest(*roots):
+    """
+    Drop the cached digests of the roots, call it once the files under a root have been changed
+    """
+    for root in roots:
+        TREE_DIGESTS.pop(str(root))
+
+def get_bundle_key(roots, *args):
+    """
+    The content address of a bundle built from the file trees under the roots and the build arguments
+    """
+    hasher = hashlib.sha1(BUNDLE_FORMAT.encode('utf-8'))
+    for arg in args:
+        hasher.update('{}\n'.format(arg).encode('utf-8'))
+    for root in roots:
+        hasher.update('{}\n{}\n'.format(root, get_tree_digest(root)).encode('utf-8'))
+    return hasher.hexdigest()
+
+def get_cached_bundle(bundles_root, key):
+    bundle = Path(bundles_root) / f'{key}.tar.gz'
+    if not os.path.exists(bundle):
+        return None
+    # keep the recently used bundles from being pruned
+    try:
+        os.utime(bundle)
+    except FileNotFoundError:
+        return None
+    return bundle
+
+def get_bundle_build_dir(bundles_root):
+    """
+    Where to build a bundle, next to the cache on the same file system so the bundle can be renamed into it
+    """
+    build_dir = Path(bundles_root).parent / '.bundle_builds'
+    os.makedirs(build_dir, exist_ok=True)
+    return build_dir
+
+def get_bundle_files_dir(bundle):
+    """
+    Where the files of the bundle are kept unpacked, so a single one is served without decompressing the bundle
+    """
+    return Path(bundle).with_name(Path(bundle).name.replace('.tar.gz', '.files'))
+
+def save_bundle(bundles_root, key, tarball, files_dir=None):
+    """
+    Move the built tarball and the directory of its files into the cache atomically,
+    then prune the least recently used bundles
+
+    A bundle used in the last BUNDLE_GRACE_PERIOD seconds is never pruned, it may be being sent.
+    """
+    os.makedirs(bundles_root, exist_ok=True)
+    bundle = Path(bundles_root) / f'{key}.tar.gz'
+    if files_dir:
+        try:
+            os.replace(files_dir, get_bundle_files_dir(bundle))
+        except OSError:
+            # the same bundle has been saved by a concurrent build
+            pass
+    os.replace(tarball, bundle)
+
+    bundles = []
+    for f in Path(bundles_root).glob('*.tar.gz'):
+        try:
+            bundles.append((f.stat().st_mtime, f))
+        except FileNotFoundError:
+            pass
+    bundles.sort(reverse=True)
+    now = time.time()
+    for mtime, f in bundles[BUNDLE_CACHE_SIZE:]:
+        if now - mtime < BUNDLE_GRACE_PERIOD:
+            continue
+        for path in (f, f.with_name(f.name.replace('.tar.gz', '.json'))):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        shutil.rmtree(get_bundle_files_dir(f), ignore_errors=True)
+    return bundle
+
+def iter_bundle_files(tar):
+    """
+    Iterate over (file name, member) of the files at the top level of the bundle, the ones the manifest lists
+    """
+    for member in tar:
+        if member.isfile() and os.path.dirname(member.name) in ('', '.'):
+            yield os.path.basename(member.name), member
+
+def list_bundle_files(bundle):
+    """
+    List the files of the bundle's directory of files, the same ones as iter_bundle_files, None if there is none
+    """
+    try:
+        return sorted(d.name for d in os.scandir(get_bundle_files_dir(bundle)) if d.is_file(follow_symlinks=False))
+    except FileNotFoundError:
+        return None
+
+def get_bundle_manifest(bundle):
+    """
+    Get the {file name: sha256} of the files in the bundle, it's computed once and saved next to the bundle
+    """
+    manifest_file = Path(bundle).with_name(Path(bundle).name.replace('.tar.gz', '.json'))
+    try:
+        with open(manifest_file) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    def hash_file(f):
+        hasher = hashlib.sha256()
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            hasher.update(chunk)
+        return hasher.hexdigest()
+
+    manifest = {}
+    names = list_bundle_files(bundle)
+    if names is not None:
+        files_dir = get_bundle_files_dir(bundle)
+        for name in names:
+            with open(files_dir / name, 'rb') as f:
+                manifest[name] = hash_file(f)
+    else:
+        with tarfile.open(bundle) as tar:
+            for name, member in iter_bundle_files(tar):
+                with tar.extractfile(member) as f:
+                    manifest[name] = hash_file(f)
+
+    temp_file = manifest_file.with_suffix('.tmp')
+    with open(temp_file, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_file, manifest_file)
+    return manifest
+
+def open_bundle_file(bundle, name):
+    """
+    Open a file at the top level of the bundle for reading in binary, return None if it's not found
+
+    It's opened from the bundle's directory of files, the bundles cached without one are scanned instead.
+    """
+    names = list_bundle_files(bundle)
+    if names is not None:
+        if name not in names:
+            return None
+        try:
+            return open(get_bundle_files_dir(bundle) / name, 'rb')
+        except FileNotFoundError:
+            return None
+
+    with tarfile.open(bundle) as tar:
+        for member_name, member in iter_bundle_files(tar):
+            if member_name == name:
+                with tar.extractfile(member) as f:
+                    return BytesIO(f.read())
+    return None
@@ -32,24 +32,24 @@ def token_required_if_proprietary(f):
             if status != 200:
                 return ret, status
             kwargs['user'] = ret['data']
-            user = User.objects(pk=user['user_id']).first()
+            identity, _ = Auth.get_identity(request.headers.get('X-Token'))
             organization = None
             team = None
 
             org_id = data.get('organization', None)
             team_id = data.get('team', None)
             if team_id and team_id != 'undefined' and team_id != 'null':
-                team = Team.objects(pk=team_id).first()
+                if team_id not in identity.teams:
+                    return response_message(EINVAL, 'Your are not a team member'), 400
+                team = identity.get_document(Team, team_id)
                 if not team:
                     return response_message(ENOENT, 'Team not found'), 404
-                if team not in user.teams:
-                    return response_message(EINVAL, 'Your are not a team member'), 400
             if org_id and org_id != 'undefined' and org_id != 'null':
-                organization = Organization.objects(pk=org_id).first()
+                if org_id not in identity.organizations:
+                    return response_message(EINVAL, 'You are not an organization member'), 400
+                organization = identity.get_document(Organization, org_id)
                 if not organization:
                     return response_message(ENOENT, 'Organization not found'), 404
-                if organization not in user.organizations:
-                    return response_message(EINVAL, 'You are not an organization member'), 400
             kwargs['team'] = team
             kwargs['organization'] = organization
 
@@ -76,31 +76,39 @@ def admin_token_required(f):
 
 def organization_team_required(*args, **kwargs):
     data = kwargs['data']
-    user = kwargs['user']
     organization = None
     team = None
 
-    user = User.objects(pk=user['user_id']).first()
-    if not user:
-        return response_message(ENOENT, 'User not found'), 404
+    identity, error = Auth.get_identity(request.headers.get('X-Token'))
+    if error:
+        return error
 
     org_id = data.get('organization', None)
     team_id = data.get('team', None)
+    # the memberships are checked against the cached identity, the documents are served from it too
     if team_id and team_id != 'undefined' and team_id != 'null':
-        team = Team.objects(pk=team_id).first()
-        if not team:
-            return response_message(ENOENT, 'Team not found'), 404
-        if team not in user.teams:
+        if team_id not in identity.teams:
+            if not Team.objects(pk=team_id).count():
+                return response_message(ENOENT, 'Team not found'), 404
             return response_message(EINVAL, 'Field organization_team is incorrect, not a team member joined'), 400
     if org_id and org_id != 'undefined' and org_id != 'null':
-        organization = Organization.objects(pk=org_id).first()
-        if not organization:
-            return response_message(ENOENT, 'Organization not found'), 404
-        if organization not in user.organizations:
+        if org_id not in identity.organizations:
+            if not Organization.objects(pk=org_id).count():
+                return response_message(ENOENT, 'Organization not found'), 404
             return response_message(EINVAL, 'Field organization_team is incorrect, not a organization member joined'), 400
+    else:
+        return response_message(EINVAL, 'Please select an organization or team first'), 400
 
+    user = Auth.get_user(identity)
+    if not user:
+        return response_message(ENOENT, 'User not found'), 404
+    if team_id and team_id != 'undefined' and team_id != 'null':
+        team = identity.get_document(Team, team_id)
+        if not team:
+            return response_message(ENOENT, 'Team not found'), 404
+    organization = identity.get_document(Organization, org_id)
     if not organization:
-        return response_message(EINVAL, 'Please select an organization or team first'), 400
+        return response_message(ENOENT, 'Organization not found'), 404
 
     return (user, team, organization), 200
 
@@ -129,7 +129,7 @@ class TestResultDto:
     })
     test_report = api.model('test_report', {
         'items': fields.List(fields.Nested(test_report_summary)),
-        'total': fields.Integer(),
+        'total': fields.Integer(description='The number of the test reports, null if paginated by after'),
     })
     task_id = api.model('task_id', {
         'task_id': fields.String(required=True, description='The task id'),
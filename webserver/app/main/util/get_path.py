@@ -11,6 +11,7 @@ TEST_RESULTS_ROOT = 'test_results'
 USER_SCRIPT_ROOT = 'user_scripts'
 BACK_SCRIPT_ROOT = 'back_scripts'
 TEST_PACKAGE_ROOT = 'pypi'
+BUNDLES_ROOT = 'bundles'
 USERS_ROOT = Path(get_config().USERS_ROOT)
 UPLOAD_ROOT = Path(get_config().UPLOAD_ROOT)
 STORE_ROOT = Path(get_config().STORE_ROOT)
@@ -72,6 +73,20 @@ def get_user_scripts_root(task=None, team=None, organization=None):
     result_dir = result_dir / USER_SCRIPT_ROOT
     return result_dir
 
+def get_bundles_root(task=None, team=None, organization=None):
+    if task:
+        if team or organization:
+            current_app.logger.error('team or organization should not used along wite task')
+            return None
+        organization = task.organization
+        team = task.team
+
+    result_dir = USERS_ROOT / organization.path
+    if team:
+        result_dir = result_dir / team.path
+    result_dir = result_dir / BUNDLES_ROOT
+    return result_dir
+
 def get_upload_files_root(task):
     return UPLOAD_ROOT / task.upload_dir
 
@@ -0,0 +1,58 @@
+from bson import DBRef
+from mongoengine import Document, ListField, ReferenceField
+from mongoengine.base.datastructures import BaseList
+
+
+def reference_id(value):
+    if isinstance(value, DBRef):
+        return value.id
+    if isinstance(value, Document):
+        return value.pk
+    return value
+
+def prefetch_references(documents, field, only=None):
+    """
+    Resolve a reference field, or a list of references, of all documents with one $in query
+
+    The referenced documents replace the references in place, so accessing the field won't query them one by one.
+    If only is given, just these fields of the referenced documents are loaded, don't access the others.
+    Return the documents as a list.
+    """
+    documents = list(documents)
+    if not documents:
+        return documents
+
+    reference = documents[0]._fields[field]
+    is_list = isinstance(reference, ListField)
+    if is_list:
+        reference = reference.field
+    if not isinstance(reference, ReferenceField):
+        raise TypeError('{} is not a reference field'.format(field))
+
+    ids = set()
+    for doc in documents:
+        value = doc._data.get(field, None)
+        for v in (value or []) if is_list else [value]:
+            if v is not None and not isinstance(v, Document):
+                ids.add(reference_id(v))
+    if not ids:
+        return documents
+
+    referenced = reference.document_type.objects(pk__in=list(ids))
+    if only:
+        referenced = referenced.only(*only)
+    referenced = {doc.pk: doc for doc in referenced}
+
+    for doc in documents:
+        value = doc._data.get(field, None)
+        if value is None:
+            continue
+        # the missing documents are left as the references
+        if is_list:
+            value = BaseList([referenced.get(reference_id(v), v) for v in value], doc, field)
+            # tell mongoengine that the list needs no more dereferencing
+            value._dereferenced = True
+            doc._data[field] = value
+        else:
+            doc._data[field] = referenced.get(reference_id(value), value)
+    return documents
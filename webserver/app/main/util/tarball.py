@@ -1,19 +1,95 @@
 import os
+import stat
 import sys
 import shutil
 import tarfile
 import zipfile
+import zlib
 from pathlib import Path
 from flask import current_app
 
-def make_tarfile_from_dir(output_filename, source_dir):
+TARBALL_CHUNK_SIZE = 64 * 1024
+
+def make_tarfile_from_dir(output_filename, source_dir, compresslevel=9):
     if not output_filename.endswith('.gz'):
         output_filename += '.tar.gz'
-    with tarfile.open(output_filename, "w:gz") as tar:
+    with tarfile.open(output_filename, "w:gz", compresslevel=compresslevel) as tar:
         tar.add(source_dir, arcname='.')
 
     return output_filename
 
+def _tarinfo(path, arcname):
+    """
+    The header of a directory, a regular file or a symbolic link, which is stored as a link as tarfile.add does
+
+    Return None for the other file types.
+    """
+    st = os.lstat(path)
+    tarinfo = tarfile.TarInfo(arcname)
+    tarinfo.mtime = st.st_mtime
+    tarinfo.mode = stat.S_IMODE(st.st_mode)
+    if stat.S_ISDIR(st.st_mode):
+        tarinfo.type = tarfile.DIRTYPE
+    elif stat.S_ISLNK(st.st_mode):
+        tarinfo.type = tarfile.SYMTYPE
+        tarinfo.linkname = os.readlink(path)
+    elif stat.S_ISREG(st.st_mode):
+        tarinfo.size = st.st_size
+    else:
+        return None
+    return tarinfo
+
+def _tar_entries(source_dir, chunk_size):
+    for root, dirs, files in os.walk(source_dir, followlinks=False):
+        # the symbolic links to directories are stored as links, not walked into
+        links = [d for d in dirs if os.path.islink(os.path.join(root, d))]
+        dirs[:] = sorted(d for d in dirs if d not in links)
+        relpath = os.path.relpath(root, source_dir)
+        arcroot = '.' if relpath == '.' else './' + relpath.replace(os.sep, '/')
+        yield _tarinfo(root, arcroot).tobuf(tarfile.DEFAULT_FORMAT, 'utf-8', 'surrogateescape')
+        for name in sorted(files + links):
+            path = os.path.join(root, name)
+            tarinfo = _tarinfo(path, arcroot + '/' + name)
+            if tarinfo is None:
+                continue
+            yield tarinfo.tobuf(tarfile.DEFAULT_FORMAT, 'utf-8', 'surrogateescape')
+            if not tarinfo.isreg():
+                continue
+            remaining = tarinfo.size
+            with open(path, 'rb') as f:
+                while remaining > 0:
+                    chunk = f.read(min(chunk_size, remaining))
+                    if not chunk:
+                        # the file was truncated after its header was written
+                        chunk = tarfile.NUL * min(chunk_size, remaining)
+                    remaining -= len(chunk)
+                    yield chunk
+            if tarinfo.size % tarfile.BLOCKSIZE:
+                yield tarfile.NUL * (tarfile.BLOCKSIZE - tarinfo.size % tarfile.BLOCKSIZE)
+    yield tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+
+def stream_tarfile_from_dir(source_dir, compresslevel=9, chunk_size=TARBALL_CHUNK_SIZE):
+    """
+    Generate the tarball of a directory chunk by chunk, as make_tarfile_from_dir does, without a temporary file
+
+    Memory usage is bounded by chunk_size. The tarball is gzip compressed unless compresslevel is 0.
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compresslevel else None
+    size = 0
+    for data in _tar_entries(source_dir, chunk_size):
+        size += len(data)
+        if compressor:
+            data = compressor.compress(data)
+        if data:
+            yield data
+
+    # pad the archive to a full record like tarfile does
+    data = tarfile.NUL * (-size % tarfile.RECORDSIZE)
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
 def make_tarfile(output_filename, files):
     if not output_filename.endswith('.gz'):
         output_filename += '.tar.gz'
@@ -0,0 +1,53 @@
+import hashlib
+import unittest
+
+from app.main.util.bloomfilter import BloomFilter, HashSet
+
+
+def digest(i):
+    return hashlib.sha256(str(i).encode()).digest()
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add(digest(i))
+        for i in range(1000):
+            self.assertIn(digest(i), bloom)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(digest(i))
+        positives = sum(digest(i) in bloom for i in range(1000, 11000))
+        self.assertLess(positives, 300)
+
+
+class TestHashSet(unittest.TestCase):
+
+    def test_membership(self):
+        digests = HashSet(digest(i) for i in range(100))
+        for i in range(100):
+            self.assertIn(digest(i), digests)
+        for i in range(100, 1100):
+            self.assertNotIn(digest(i), digests)
+
+    def test_add_beyond_capacity(self):
+        digests = HashSet(capacity=16)
+        for i in range(1000):
+            digests.add(digest(i))
+        self.assertEqual(len(digests), 1000)
+        for i in range(1000):
+            self.assertIn(digest(i), digests)
+        self.assertNotIn(digest(1000), digests)
+
+    def test_add_duplicate(self):
+        digests = HashSet([digest(0)])
+        digests.add(digest(0))
+        self.assertEqual(len(digests), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
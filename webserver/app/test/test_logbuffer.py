@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from task_runner.util import logbuffer
+from task_runner.util.logbuffer import LogBuffer
+
+
+class TestLogBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'console.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_tail_is_bounded(self):
+        log = LogBuffer(self.path, tail_size=10)
+        for s in ('0123456', '789ab', 'cdef'):
+            log.write(s)
+        self.assertEqual(log.tail(), ('6789abcdef', 6))
+        log.close()
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), '0123456789abcdef')
+
+    def test_close_clears_the_tail(self):
+        log = LogBuffer(self.path)
+        log.write('hello')
+        log.close()
+        self.assertEqual(log.tail(), ('', 5))
+        log.write('ignored')
+        self.assertEqual(log.read(0), ('hello', 5))
+
+    def test_tail_starts_a_line(self):
+        log = LogBuffer(self.path, tail_size=12)
+        log.write('first line\nsecond\nthird\n')
+        text, offset = log.tail()
+        self.assertEqual(text, 'third\n')
+        self.assertEqual(log.read(offset), (text, offset + len(text)))
+
+        log.write('€' * 20)
+        text, offset = log.tail()
+        self.assertEqual(text, '€' * 12)
+        self.assertEqual(log.read(offset)[0], text)
+        log.close()
+
+    def test_memory_limit_spans_buffers(self):
+        limit = logbuffer.LOG_MEMORY_LIMIT
+        logbuffer.LOG_MEMORY_LIMIT = LogBuffer._total_size + 3 * logbuffer.LOG_TAIL_MIN
+        try:
+            big = LogBuffer(os.path.join(self.temp_dir, 'big.log'))
+            big.write('x' * 3 * logbuffer.LOG_TAIL_MIN)
+            small = LogBuffer(os.path.join(self.temp_dir, 'small.log'))
+            small.write('y' * logbuffer.LOG_TAIL_MIN)
+            # the largest buffer gives up its tail, not the one being written
+            self.assertEqual(len(small.tail()[0]), logbuffer.LOG_TAIL_MIN)
+            self.assertEqual(len(big.tail()[0]), 2 * logbuffer.LOG_TAIL_MIN)
+            self.assertLessEqual(LogBuffer._total_size, logbuffer.LOG_MEMORY_LIMIT)
+            big.close()
+            small.close()
+        finally:
+            logbuffer.LOG_MEMORY_LIMIT = limit
+
+    def test_read_pages(self):
+        log = LogBuffer(self.path)
+        log.write('0123456789')
+        self.assertEqual(log.read(0, 4), ('0123', 4))
+        self.assertEqual(log.read(4, 4), ('4567', 8))
+        self.assertEqual(log.read(8, 4), ('89', 10))
+        self.assertEqual(log.read(10, 4), ('', 10))
+        log.close()
+
+    def test_read_pages_on_character_boundary(self):
+        text = 'aé€😀' * 10
+        log = LogBuffer(self.path)
+        log.write(text)
+        log.close()
+        pages = []
+        offset = 0
+        while True:
+            page, next_offset = log.read(offset, 5)
+            if next_offset == offset:
+                break
+            self.assertNotIn('�', page)
+            pages.append(page)
+            offset = next_offset
+        self.assertEqual(''.join(pages), text)
+        self.assertEqual(offset, len(text.encode('utf-8')))
+
+    def test_read_missing_file(self):
+        log = LogBuffer(self.path)
+        log.close()
+        os.unlink(self.path)
+        self.assertEqual(log.read(3), ('', 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import threading
+import unittest
+
+from task_runner.util.scheduler import EndpointScheduler
+
+
+class FakeApp():
+    logger = logging.getLogger(__name__)
+
+
+class TestEndpointScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_running = 0
+        self.max_per_endpoint = 0
+        self.runs = {}
+        self.done = threading.Event()
+
+    def process_next(self, endpoint_id, runs, total):
+        async def process():
+            with self.lock:
+                self.running[endpoint_id] = self.running.get(endpoint_id, 0) + 1
+                self.max_per_endpoint = max(self.max_per_endpoint, self.running[endpoint_id])
+                self.max_running = max(self.max_running, sum(self.running.values()))
+            await asyncio.sleep(0.01)
+            with self.lock:
+                self.running[endpoint_id] -= 1
+                self.runs[endpoint_id] = self.runs.get(endpoint_id, 0) + 1
+                if sum(self.runs.values()) == total:
+                    self.done.set()
+                return self.runs[endpoint_id] < runs
+        return process
+
+    def test_serialize_per_endpoint_and_cap(self):
+        scheduler = EndpointScheduler(max_running=2)
+        scheduler.start(FakeApp())
+        endpoints = ['endpoint-{}'.format(i) for i in range(4)]
+        for endpoint_id in endpoints:
+            # scheduling again while a worker is busy must not start a second one
+            for i in range(3):
+                scheduler.schedule(endpoint_id, self.process_next(endpoint_id, 3, 12))
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.max_per_endpoint, 1)
+        self.assertLessEqual(self.max_running, 2)
+        for endpoint_id in endpoints:
+            self.assertGreaterEqual(self.runs[endpoint_id], 3)
+
+    def test_pending_schedule_runs_again(self):
+        scheduler = EndpointScheduler(max_running=1)
+        scheduler.start(FakeApp())
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        async def process_next():
+            calls.append(1)
+            if len(calls) == 1:
+                started.set()
+                while not release.is_set():
+                    await asyncio.sleep(0.01)
+            else:
+                self.done.set()
+            return False
+
+        scheduler.schedule('endpoint', process_next)
+        self.assertTrue(started.wait(5))
+        self.assertTrue(scheduler.is_running('endpoint'))
+        scheduler.schedule('endpoint', process_next)
+        release.set()
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
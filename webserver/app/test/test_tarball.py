@@ -0,0 +1,83 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+from io import BytesIO
+
+from app.main.util.tarball import stream_tarfile_from_dir
+
+
+class TestStreamTarfile(unittest.TestCase):
+
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.files = {
+            'empty.txt': b'',
+            'small.txt': b'hello\n',
+            'block.bin': os.urandom(tarfile.BLOCKSIZE),
+            os.path.join('sub', 'large.bin'): os.urandom(3 * 64 * 1024 + 100),
+            os.path.join('sub', 'deeper', 'unicode-é.txt'): 'é€😀'.encode('utf-8'),
+        }
+        for name, data in self.files.items():
+            path = os.path.join(self.source_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+        os.makedirs(os.path.join(self.source_dir, 'empty_dir'))
+
+    def tearDown(self):
+        shutil.rmtree(self.source_dir, ignore_errors=True)
+
+    def round_trip(self, **kwargs):
+        data = b''.join(stream_tarfile_from_dir(self.source_dir, **kwargs))
+        with tarfile.open(fileobj=BytesIO(data)) as tar:
+            members = {m.name: m for m in tar.getmembers()}
+            for name, content in self.files.items():
+                member = members['./' + name.replace(os.sep, '/')]
+                self.assertTrue(member.isfile())
+                with tar.extractfile(member) as f:
+                    self.assertEqual(f.read(), content)
+            for name in ('.', './sub', './sub/deeper', './empty_dir'):
+                self.assertTrue(members[name].isdir())
+            self.assertEqual(len(members), len(self.files) + 4)
+        return data
+
+    def test_gzip(self):
+        self.round_trip()
+
+    def test_uncompressed(self):
+        data = self.round_trip(compresslevel=0)
+        self.assertEqual(len(data) % tarfile.RECORDSIZE, 0)
+
+    def test_small_chunks(self):
+        self.round_trip(compresslevel=1, chunk_size=1000)
+
+    def test_symlinks_stored_as_links(self):
+        os.symlink('small.txt', os.path.join(self.source_dir, 'file_link'))
+        os.symlink('sub', os.path.join(self.source_dir, 'dir_link'))
+        os.symlink('missing', os.path.join(self.source_dir, 'broken_link'))
+        data = b''.join(stream_tarfile_from_dir(self.source_dir))
+        with tarfile.open(fileobj=BytesIO(data)) as tar:
+            members = {m.name: m for m in tar.getmembers()}
+        for name, target in (('file_link', 'small.txt'), ('dir_link', 'sub'), ('broken_link', 'missing')):
+            self.assertTrue(members['./' + name].issym())
+            self.assertEqual(members['./' + name].linkname, target)
+        self.assertNotIn('./dir_link/large.bin', members)
+
+        # the same members as tarfile.add stores
+        with BytesIO() as buf:
+            with tarfile.open(fileobj=buf, mode='w') as tar:
+                tar.add(self.source_dir, arcname='.')
+            buf.seek(0)
+            with tarfile.open(fileobj=buf) as tar:
+                expected = {m.name: (m.type, m.linkname) for m in tar.getmembers()}
+        self.assertEqual({name: (m.type, m.linkname) for name, m in members.items()}, expected)
+
+    def test_chunk_size_bounds_memory(self):
+        for chunk in stream_tarfile_from_dir(self.source_dir, compresslevel=0, chunk_size=1000):
+            self.assertLessEqual(len(chunk), max(1000, tarfile.RECORDSIZE))
+
+
+if __name__ == '__main__':
+    unittest.main()
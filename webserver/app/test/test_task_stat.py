@@ -0,0 +1,98 @@
+import datetime
+import unittest
+
+from mongoengine import connect, disconnect
+from pymongo.errors import PyMongoError
+
+from app.main.config import get_config
+from app.main.model.database import Organization, Task, TaskStat, Team
+
+TEST_DATABASE = 'auto_test_unittest'
+
+
+class TestTaskStat(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = connect(TEST_DATABASE, host=get_config().MONGODB_URL, port=get_config().MONGODB_PORT,
+                             serverSelectionTimeoutMS=1000)
+        try:
+            cls.client.drop_database(TEST_DATABASE)
+        except PyMongoError:
+            disconnect()
+            raise unittest.SkipTest('MongoDB is not available')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.drop_database(TEST_DATABASE)
+        disconnect()
+
+    def setUp(self):
+        self.organization = Organization(name='organization', path='organization')
+        self.organization.save()
+        self.team = Team(name='team', organization=self.organization, path='team')
+        self.team.save()
+        self.run_date = datetime.datetime(2020, 1, 2, 3, 4, 5)
+        self.date = datetime.datetime(2020, 1, 2)
+
+    def tearDown(self):
+        for document in (TaskStat, Task, Team, Organization):
+            document.objects.delete()
+
+    def create_task(self, status):
+        task = Task(status=status, run_date=self.run_date, organization=self.organization, team=self.team)
+        task.save()
+        return task
+
+    def get_stat(self):
+        return TaskStat.objects(organization=self.organization, team=self.team, date=self.date).first()
+
+    def test_count_task_once(self):
+        task = self.create_task('successful')
+        TaskStat.count_task(task)
+        TaskStat.count_task(task)
+        stat = self.get_stat()
+        self.assertEqual((stat.succeeded, stat.failed), (1, 0))
+
+        task.status = 'failed'
+        task.save()
+        TaskStat.count_task(task)
+        stat = self.get_stat()
+        self.assertEqual((stat.succeeded, stat.failed), (0, 1))
+
+    def test_discount_deleted_task(self):
+        tasks = [self.create_task('successful'), self.create_task('failed'), self.create_task('successful')]
+        for task in tasks:
+            TaskStat.count_task(task)
+        TaskStat.discount_task(tasks[0])
+        tasks[0].delete()
+        stat = self.get_stat()
+        self.assertEqual((stat.succeeded, stat.failed), (1, 1))
+
+        # discounting twice takes nothing more
+        TaskStat.discount_task(tasks[0])
+        stat = self.get_stat()
+        self.assertEqual((stat.succeeded, stat.failed), (1, 1))
+
+    def test_discount_uncounted_task(self):
+        counted = self.create_task('successful')
+        TaskStat.count_task(counted)
+        task = self.create_task('running')
+        TaskStat.discount_task(task)
+        stat = self.get_stat()
+        self.assertEqual((stat.succeeded, stat.failed), (1, 0))
+
+    def test_rebuild_agrees_with_count(self):
+        tasks = [self.create_task('successful'), self.create_task('failed'), self.create_task('successful')]
+        for task in tasks:
+            TaskStat.count_task(task)
+        TaskStat.discount_task(tasks[1])
+        tasks[1].delete()
+        counted = self.get_stat()
+        self.assertEqual(TaskStat.rebuild(), 1)
+        rebuilt = self.get_stat()
+        self.assertEqual((rebuilt.succeeded, rebuilt.failed), (counted.succeeded, counted.failed))
+
+
+if __name__ == '__main__':
+    unittest.main()
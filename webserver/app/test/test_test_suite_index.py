@@ -0,0 +1,71 @@
+import datetime
+import unittest
+
+from mongoengine import connect, disconnect
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app.main.config import get_config
+from app.main.model.database import Endpoint, Organization, Task, Test
+
+TEST_DATABASE = 'auto_test_unittest'
+
+
+class TestTestSuiteIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = connect(TEST_DATABASE, host=get_config().MONGODB_URL, port=get_config().MONGODB_PORT,
+                             serverSelectionTimeoutMS=1000)
+        try:
+            cls.client.drop_database(TEST_DATABASE)
+        except PyMongoError:
+            disconnect()
+            raise unittest.SkipTest('MongoDB is not available')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.drop_database(TEST_DATABASE)
+        disconnect()
+
+    def setUp(self):
+        self.organization = Organization(name='organization', path='organization')
+        self.organization.save()
+        # the collection as left by the old versions
+        self.collection = Test._get_db()[Test._get_collection_name()]
+        self.collection.drop()
+        self.collection.create_index([(field, 1) for field in Test.UNIQUE_KEY])
+
+    def tearDown(self):
+        for document in (Endpoint, Task, Organization):
+            document.objects.delete()
+        self.collection.drop()
+
+    def insert_test(self, days):
+        return self.collection.insert_one({
+            'test_suite': 'suite', 'path': 'dir', 'organization': self.organization.pk,
+            'update_date': datetime.datetime(2020, 1, 1) + datetime.timedelta(days=days)
+        }).inserted_id
+
+    def test_drop_duplicates(self):
+        old, newest, older = self.insert_test(1), self.insert_test(3), self.insert_test(2)
+        task = Task(test=old)
+        task.save()
+        endpoint = Endpoint(name='endpoint', tests=[old, older])
+        endpoint.save()
+
+        self.assertEqual(Test.drop_duplicates(), 2)
+        self.assertEqual([t['_id'] for t in self.collection.find()], [newest])
+        task.reload()
+        self.assertEqual(task.test.pk, newest)
+        endpoint.reload()
+        self.assertEqual([t.pk for t in endpoint.tests], [newest])
+
+        # nothing to do once the old index is gone
+        self.assertEqual(Test.drop_duplicates(), 0)
+        Test.ensure_indexes()
+        with self.assertRaises(DuplicateKeyError):
+            self.insert_test(4)
+
+
+if __name__ == '__main__':
+    unittest.main()
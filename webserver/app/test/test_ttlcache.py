@@ -0,0 +1,63 @@
+import unittest
+
+from app.main.util.ttlcache import TTLCache
+
+
+class FakeTimer():
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.cache = TTLCache(maxsize=3, ttl=10, timer=self.timer)
+
+    def test_get_before_expiry(self):
+        self.cache.set('a', 1)
+        self.timer.now = 9
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.stats(), {'size': 1, 'hits': 1, 'misses': 0})
+
+    def test_expiry(self):
+        self.cache.set('a', 1)
+        self.timer.now = 10
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('a', 'missing'), 'missing')
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_set_again_renews_expiry(self):
+        self.cache.set('a', 1)
+        self.timer.now = 5
+        self.cache.set('a', 2)
+        self.timer.now = 14
+        self.assertEqual(self.cache.get('a'), 2)
+
+    def test_evict_least_recently_used(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.cache.get('a')
+        self.cache.set('d', 'd')
+        self.assertEqual(len(self.cache), 3)
+        self.assertIsNone(self.cache.get('b'))
+        for key in ('a', 'c', 'd'):
+            self.assertEqual(self.cache.get(key), key)
+
+    def test_pop(self):
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.pop('a'), 1)
+        self.assertIsNone(self.cache.pop('a'))
+        self.assertEqual(self.cache.pop('a', 0), 0)
+
+    def test_falsy_values_are_cached(self):
+        self.cache.set('a', 0)
+        self.assertEqual(self.cache.get('a', 'missing'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
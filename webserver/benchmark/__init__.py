@@ -0,0 +1,41 @@
+"""
+Benchmarks for the hot paths of the webserver and the task runner
+
+They talk to a real MongoDB with a throwaway database, run them under the webserver directory:
+    python -m benchmark.<name> --help
+"""
+import statistics
+
+from mongoengine import connect
+
+from app.main import create_app
+from app.main.config import get_config
+
+BENCHMARK_DATABASE = 'auto_test_benchmark'
+
+
+def setup_app():
+    """Create the flask app and connect to the benchmark database, a clean database is guaranteed"""
+    app = create_app('dev')
+    app.app_context().push()
+    client = connect(BENCHMARK_DATABASE, host=get_config().MONGODB_URL, port=get_config().MONGODB_PORT)
+    client.drop_database(BENCHMARK_DATABASE)
+    return app, client
+
+def teardown_app(client):
+    client.drop_database(BENCHMARK_DATABASE)
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, max(0, round(p / 100 * len(samples)) - 1))
+    return samples[index]
+
+def report(title, samples, unit='ms', scale=1000):
+    """Print the latency distribution of the samples measured in seconds"""
+    print('{}: n={} mean={:.3f}{unit} p50={:.3f}{unit} p99={:.3f}{unit} max={:.3f}{unit}'.format(
+        title, len(samples),
+        statistics.mean(samples) * scale,
+        percentile(samples, 50) * scale,
+        percentile(samples, 99) * scale,
+        max(samples) * scale,
+        unit=unit))
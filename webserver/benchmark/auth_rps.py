@@ -0,0 +1,162 @@
+"""
+Measure the requests per second of trivial authenticated endpoints
+
+The "before" endpoints use a copy of the original decorators, which decoded the token, looked the token up
+in the blacklist collection and loaded the user, team and organization on every request. The "after"
+endpoints use the decorators of the app, which resolve the token once per request and serve the identity,
+along with its organizations and teams, from a short living cache.
+"""
+import argparse
+import time
+import uuid
+from functools import wraps
+
+import jwt
+from flask import request
+
+from app.main.config import key
+from app.main.model.database import BlacklistToken, Organization, Team, User
+from app.main.util.decorator import organization_team_required_by_args, token_required
+from app.main.util.response import *
+
+from . import setup_app, teardown_app, report
+
+
+def original_check_blacklist(auth_token):
+    try:
+        BlacklistToken.objects(token=str(auth_token)).get()
+    except BlacklistToken.DoesNotExist:
+        return False
+    except BlacklistToken.MultipleObjectsReturned:
+        pass
+    return True
+
+def original_get_logged_in_user(token):
+    if token:
+        try:
+            payload = jwt.decode(token, key)
+            if original_check_blacklist(token):
+                payload = 'Token blacklisted. Please log in again.'
+        except jwt.ExpiredSignatureError:
+            payload = 'Signature expired. Please log in again.'
+        except jwt.InvalidTokenError:
+            payload = 'Invalid token. Please log in again.'
+        if not isinstance(payload, str):
+            user = User.objects(pk=payload['sub']).first()
+            if user:
+                return response_message(SUCCESS,
+                        user_id=str(user.id),
+                        email=user.email,
+                        username=user.name,
+                        roles=user.roles,
+                        registered_on=user.registered_on,
+                        avatar=user.avatar,
+                        introduction=user.introduction,
+                        region=user.region
+                    ), 200
+            return response_message(USER_NOT_EXIST), 404
+        return response_message(TOKEN_ILLEGAL, payload), 401
+    return response_message(TOKEN_REQUIRED), 401
+
+def original_token_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        ret, status = original_get_logged_in_user(request.headers.get('X-Token'))
+        if status != 200:
+            return ret, status
+        kwargs['user'] = ret['data']
+        return f(*args, **kwargs)
+    return decorated
+
+def original_organization_team_required_by_args(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        data = request.args
+        organization = None
+        team = None
+
+        user = User.objects(pk=kwargs['user']['user_id']).first()
+        if not user:
+            return response_message(ENOENT, 'User not found'), 404
+
+        org_id = data.get('organization', None)
+        team_id = data.get('team', None)
+        if team_id and team_id != 'undefined' and team_id != 'null':
+            team = Team.objects(pk=team_id).first()
+            if not team:
+                return response_message(ENOENT, 'Team not found'), 404
+            if team not in user.teams:
+                return response_message(EINVAL, 'Field organization_team is incorrect, not a team member joined'), 400
+        if org_id and org_id != 'undefined' and org_id != 'null':
+            organization = Organization.objects(pk=org_id).first()
+            if not organization:
+                return response_message(ENOENT, 'Organization not found'), 404
+            if organization not in user.organizations:
+                return response_message(EINVAL, 'Field organization_team is incorrect, not a organization member joined'), 400
+        if not organization:
+            return response_message(EINVAL, 'Please select an organization or team first'), 400
+
+        kwargs['user'] = user
+        kwargs['team'] = team
+        kwargs['organization'] = organization
+        return f(*args, **kwargs)
+    return decorated
+
+def measure(web, url, token, duration):
+    latencies = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        resp = web.get(url, headers={'X-Token': token})
+        latencies.append(time.perf_counter() - start)
+        if resp.status_code != 200:
+            raise RuntimeError('{} returned {}: {}'.format(url, resp.status_code, resp.get_data(as_text=True)))
+    return latencies
+
+def run(duration):
+    app, client = setup_app()
+
+    @app.route('/benchmark/before/token')
+    @original_token_required
+    def token_before(**kwargs):
+        return {'user_id': kwargs['user']['user_id']}
+
+    @app.route('/benchmark/after/token')
+    @token_required
+    def token_after(**kwargs):
+        return {'user_id': kwargs['user']['user_id']}
+
+    @app.route('/benchmark/before/organization_team')
+    @original_token_required
+    @original_organization_team_required_by_args
+    def organization_team_before(**kwargs):
+        return {'organization': kwargs['organization'].name}
+
+    @app.route('/benchmark/after/organization_team')
+    @token_required
+    @organization_team_required_by_args
+    def organization_team_after(**kwargs):
+        return {'organization': kwargs['organization'].name}
+
+    organization = Organization(name='benchmark', path=str(uuid.uuid4()))
+    organization.save()
+    team = Team(name='benchmark', organization=organization, path='benchmark')
+    team.save()
+    user = User(email='benchmark@example.com', name='benchmark', organizations=[organization], teams=[team])
+    user.save()
+    token = User.encode_auth_token(str(user.id)).decode()
+
+    web = app.test_client()
+    query = '?organization={}&team={}'.format(organization.id, team.id)
+    for name, path in (('token_required', 'token'), ('organization_team_required', 'organization_team' + query)):
+        for title in ('before', 'after'):
+            latencies = measure(web, '/benchmark/{}/{}'.format(title, path), token, duration)
+            report('{} {}'.format(name, title), latencies)
+            print('  {:.0f} requests/sec'.format(len(latencies) / sum(latencies)))
+    teardown_app(client)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--duration', type=float, default=10, help='seconds to measure each endpoint')
+    args = parser.parse_args()
+    run(args.duration)
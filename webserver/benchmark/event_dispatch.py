@@ -0,0 +1,51 @@
+"""
+Measure the latency from util.push_event to the event handler running in the runner's event loop
+"""
+import argparse
+import threading
+import time
+
+from app.main.model.database import EventQueue, Organization
+from app.main.util import push_event
+from task_runner import runner
+
+from . import setup_app, teardown_app, report
+
+EVENT_CODE_BENCHMARK = 299
+
+
+def run(count, interval):
+    app, client = setup_app()
+    organization = Organization(name='benchmark')
+    organization.save()
+    EventQueue().save()
+
+    latencies = []
+    handled = threading.Event()
+
+    def event_handler_benchmark(app, event):
+        latencies.append(time.perf_counter() - event.message['pushed'])
+        handled.set()
+
+    runner.EVENT_HANDLERS[EVENT_CODE_BENCHMARK] = event_handler_benchmark
+    thread = threading.Thread(target=runner.event_loop, args=(app,), name='event_loop')
+    thread.daemon = True
+    thread.start()
+
+    for i in range(count):
+        # let the event loop go idle so that the wake-up path is measured instead of a busy queue
+        time.sleep(interval)
+        handled.clear()
+        push_event(organization, None, EVENT_CODE_BENCHMARK, {'pushed': time.perf_counter()})
+        if not handled.wait(runner.EVENT_POLL_INTERVAL * 2):
+            print('event {} was not handled in time'.format(i))
+
+    report('push to handler latency', latencies)
+    teardown_app(client)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--count', type=int, default=200, help='the number of events to push')
+    parser.add_argument('-i', '--interval', type=float, default=0.05, help='the idle time in seconds before each push')
+    args = parser.parse_args()
+    run(args.count, args.interval)
@@ -0,0 +1,77 @@
+"""
+Compare the keyword call latency of robot's XML-RPC path with the WebsocketRemote path
+
+A fake endpoint RPC proxy is registered in the runner's RPC proxy registry, so only the transport is measured.
+"""
+import argparse
+import sys
+import threading
+import time
+import xmlrpc.client
+
+from sanic.websocket import WebSocketProtocol
+
+from task_runner import runner
+from task_runner.util.xmlrpcserver import XMLRPCServer
+
+from . import report
+
+sys.path.append(runner.ROBOT_LIBRARIES_ROOT)
+from WebsocketRemote import WebsocketRemoteClient
+
+BENCHMARK_PATH = '/benchmark/echo.py'
+XMLRPC_PORT = 8270
+
+
+class FakeRequest():
+    async def get_keyword_names(self):
+        return ['echo']
+
+    async def run_keyword(self, name, args, kwargs=None):
+        return {'status': 'PASS', 'return': args[0] if args else ''}
+
+class FakeProxy():
+    request = FakeRequest()
+
+def start_servers():
+    ready = threading.Event()
+
+    @runner.RPC_APP.listener('after_server_start')
+    async def capture_loop(app, loop):
+        runner.RPC_PROXIES['loop'] = loop
+        ready.set()
+
+    thread = threading.Thread(target=runner.RPC_APP.run, name='rpc_proxy',
+                              kwargs={'host': '127.0.0.1', 'port': runner.RPC_PORT, 'protocol': WebSocketProtocol,
+                                      'register_sys_signals': False})
+    thread.daemon = True
+    thread.start()
+    ready.wait()
+
+    xmlrpc_server = XMLRPCServer(runner.RPC_PROXIES, host='127.0.0.1', port=XMLRPC_PORT)
+    xmlrpc_server.daemon = True
+    xmlrpc_server.start()
+    runner.RPC_PROXIES[BENCHMARK_PATH] = FakeProxy()
+
+def measure(call, count, payload):
+    for i in range(min(count, 50)):
+        call('echo', [payload], {})
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        call('echo', [payload], {})
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--count', type=int, default=2000, help='the number of keyword calls per transport')
+    parser.add_argument('-s', '--size', type=int, default=64, help='the size of the keyword argument in characters')
+    args = parser.parse_args()
+
+    start_servers()
+    payload = 'x' * args.size
+    xmlrpc_proxy = xmlrpc.client.ServerProxy('http://127.0.0.1:{}{}'.format(XMLRPC_PORT, BENCHMARK_PATH))
+    report('xml-rpc keyword call', measure(xmlrpc_proxy.run_keyword, args.count, payload))
+    ws_client = WebsocketRemoteClient('ws://127.0.0.1:{}/keyword{}'.format(runner.RPC_PORT, BENCHMARK_PATH))
+    report('websocket keyword call', measure(ws_client.run_keyword, args.count, payload))
@@ -0,0 +1,57 @@
+"""
+Measure the per-message cost of resolving the room of a test log message in rpc_message_relay
+
+The old relay cached full Task documents in an unbounded dict and dereferenced the organization and team,
+the new one caches room ids in a bounded TTL cache.
+"""
+import argparse
+import random
+import time
+
+from app.main.model.database import Organization, Task, Team
+from app.main.util import get_room_id
+from task_runner import runner
+
+from . import setup_app, teardown_app, report
+
+
+def old_room_id(tasks_cached, task_id):
+    if task_id not in tasks_cached:
+        task = Task.objects(pk=task_id).first()
+        tasks_cached[task_id] = task
+    else:
+        task = tasks_cached[task_id]
+    return get_room_id(str(task.organization.id), str(task.team.id) if task.team else '')
+
+def measure(resolve, task_ids, count):
+    latencies = []
+    for i in range(count):
+        task_id = random.choice(task_ids)
+        start = time.perf_counter()
+        resolve(task_id)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def run(tasks, count):
+    app, client = setup_app()
+    organization = Organization(name='benchmark')
+    organization.save()
+    team = Team(name='benchmark', organization=organization)
+    team.save()
+    task_list = [Task(test_suite='benchmark', organization=organization, team=team) for i in range(tasks)]
+    Task.objects.insert(task_list)
+    task_ids = [str(task.id) for task in task_list]
+
+    tasks_cached = {}
+    report('before: dict of Task documents', measure(lambda task_id: old_room_id(tasks_cached, task_id), task_ids, count))
+    runner.TASK_ROOMS.clear()
+    report('after: TTL cache of room ids', measure(runner.get_task_room_id, task_ids, count))
+    print('cache stats: {}'.format(runner.TASK_ROOMS.stats()))
+    teardown_app(client)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--tasks', type=int, default=100, help='the number of tasks sending messages')
+    parser.add_argument('-n', '--count', type=int, default=100000, help='the number of messages relayed')
+    args = parser.parse_args()
+    run(args.tasks, args.count)
@@ -0,0 +1,86 @@
+"""
+Measure how long extracting a large test suite package takes in install_test_suite
+
+The old installer removed the target directories, extracted every member of the egg one by one and moved the
+test suites out of scripts/, the new one extracts the egg in a single pass into a staging directory with the
+final layout and swaps the packages in by renaming. Only the file system is involved, no database is needed.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from task_runner.util.dbhelper import extract_package
+
+from . import report
+
+
+def build_egg(egg, packages, suites, libraries, size):
+    content = os.urandom(size // 2).hex()
+    with zipfile.ZipFile(egg, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('EGG-INFO/PKG-INFO', 'Name: benchmark\n')
+        for p in range(packages):
+            zf.writestr(f'package{p}/__init__.py', '')
+            for i in range(libraries):
+                zf.writestr(f'package{p}/library{i}.py', content)
+            for i in range(suites):
+                zf.writestr(f'package{p}/scripts/suite{i}.md', content)
+
+def old_extract(pkg_file, scripts_root, libraries_root):
+    with zipfile.ZipFile(pkg_file) as zf:
+        for f in zf.namelist():
+            if f.startswith('EGG-INFO'):
+                continue
+            dirname = os.path.dirname(f)
+            if os.path.exists(scripts_root / dirname):
+                shutil.rmtree(scripts_root / dirname)
+            if os.path.exists(libraries_root / dirname):
+                shutil.rmtree(libraries_root / dirname)
+
+    installed = []
+    with zipfile.ZipFile(pkg_file) as zf:
+        libraries = (f for f in zf.namelist() if not f.startswith('EGG-INFO') and '/scripts/' not in f)
+        for l in libraries:
+            zf.extract(l, libraries_root)
+        scripts = [f for f in zf.namelist() if '/scripts/' in f]
+        for s in scripts:
+            zf.extract(s, scripts_root)
+        for pkg_name in set((s.split('/', 1)[0] for s in scripts)):
+            for f in os.listdir(scripts_root / pkg_name / 'scripts'):
+                shutil.move(str(scripts_root / pkg_name / 'scripts' / f), scripts_root / pkg_name)
+                installed.append(os.path.join(pkg_name, f))
+            shutil.rmtree(scripts_root / pkg_name / 'scripts')
+    return installed
+
+def measure(extract, egg, root, count):
+    scripts_root, libraries_root = root / 'scripts', root / 'back_scripts'
+    latencies = []
+    # the first install is into empty roots, the rest replace the installed packages
+    for i in range(count):
+        start = time.perf_counter()
+        extract(egg, scripts_root, libraries_root)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def run(packages, suites, libraries, size, count):
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        egg = temp / 'benchmark.egg'
+        build_egg(egg, packages, suites, libraries, size)
+        print('egg of {} files, {:.1f} MB'.format(len(zipfile.ZipFile(egg).namelist()), os.path.getsize(egg) / 1024 / 1024))
+
+        report('before: extract, rmtree and move', measure(old_extract, egg, temp / 'before', count), unit='s', scale=1)
+        report('after: single pass staging and rename', measure(extract_package, egg, temp / 'after', count), unit='s', scale=1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--packages', type=int, default=10, help='the number of packages in the egg')
+    parser.add_argument('-s', '--suites', type=int, default=100, help='the number of test suites of each package')
+    parser.add_argument('-l', '--libraries', type=int, default=50, help='the number of library files of each package')
+    parser.add_argument('-b', '--size', type=int, default=8192, help='the size of each file in bytes')
+    parser.add_argument('-n', '--count', type=int, default=5, help='the number of installs')
+    args = parser.parse_args()
+    run(args.packages, args.suites, args.libraries, args.size, args.count)
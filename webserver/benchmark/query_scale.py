@@ -0,0 +1,105 @@
+"""
+Seed a large task collection and measure the latency of the task statistics, report list and queue APIs
+
+Each API is measured with the declared indexes and again after they are dropped.
+"""
+import argparse
+import datetime
+import os
+import random
+import shutil
+import time
+import uuid
+
+
+from app import blueprint
+from app.main.model.database import Endpoint, Organization, Task, TaskQueue, Team, User
+from app.main.util.get_path import get_test_results_root
+
+from . import setup_app, teardown_app, report
+
+SEED_BATCH_SIZE = 10000
+STATUSES = ('successful', 'failed', 'running', 'waiting', 'cancelled')
+
+
+def seed_tasks(organization, team, endpoint, count, days):
+    collection = Task._get_collection()
+    now = datetime.datetime.utcnow()
+    for start in range(0, count, SEED_BATCH_SIZE):
+        docs = []
+        for i in range(start, min(start + SEED_BATCH_SIZE, count)):
+            date = now - datetime.timedelta(seconds=random.randint(0, days * 86400))
+            docs.append({
+                'test_suite': 'benchmark-{}'.format(i % 100),
+                'status': random.choice(STATUSES),
+                'schedule_date': date,
+                'run_date': date,
+                'priority': random.randint(1, 3),
+                'endpoint_run': endpoint.pk,
+                'organization': organization.pk,
+                'team': team.pk,
+            })
+        collection.insert_many(docs, ordered=False)
+
+def measure(client, url, token, count):
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        resp = client.get(url, headers={'X-Token': token})
+        latencies.append(time.perf_counter() - start)
+        if resp.status_code != 200:
+            raise RuntimeError('{} returned {}: {}'.format(url, resp.status_code, resp.get_data(as_text=True)))
+    return latencies
+
+def run(tasks, results, count, days):
+    app, client = setup_app()
+    app.register_blueprint(blueprint)
+
+    organization = Organization(name='benchmark', path=str(uuid.uuid4()))
+    organization.save()
+    team = Team(name='benchmark', organization=organization, path='benchmark')
+    team.save()
+    user = User(email='benchmark@example.com', name='benchmark', organizations=[organization], teams=[team])
+    user.save()
+    endpoint = Endpoint(name='benchmark', uid=uuid.uuid4(), organization=organization, team=team)
+    endpoint.save()
+    for priority in range(1, 4):
+        TaskQueue(endpoint=endpoint, priority=priority, organization=organization, team=team).save()
+    seed_tasks(organization, team, endpoint, tasks, days)
+    print('seeded {} tasks'.format(Task.objects.count()))
+
+    # the report list only shows the tasks having a result directory
+    results_root = get_test_results_root(team=team, organization=organization)
+    ids = [task['_id'] for task in Task._get_collection().find({}, {'_id': True}).limit(results)]
+    for task_id in ids:
+        os.makedirs(results_root / str(task_id), exist_ok=True)
+    Task._get_collection().update_many({'_id': {'$in': ids}}, {'$set': {'has_results': True}})
+
+    token = User.encode_auth_token(str(user.id)).decode()
+    args = 'organization={}&team={}'.format(organization.id, team.id)
+    end = int(datetime.datetime.utcnow().timestamp() * 1000)
+    apis = {
+        'task statistics of 7 days': '/task/?{}&start_date={}&end_date={}'.format(args, end - 7 * 86400 * 1000, end),
+        'report list': '/testresult/?{}&page=1&limit=10'.format(args),
+        'queue list': '/endpoint/queue/?{}'.format(args),
+    }
+    web = app.test_client()
+    try:
+        for title, url in apis.items():
+            report('{} (indexed)'.format(title), measure(web, url, token, count))
+        for document in (Task, TaskQueue, Endpoint):
+            document._get_collection().drop_indexes()
+        for title, url in apis.items():
+            report('{} (no index)'.format(title), measure(web, url, token, count))
+    finally:
+        shutil.rmtree(results_root.parent.parent, ignore_errors=True)
+        teardown_app(client)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--tasks', type=int, default=1000000, help='the number of tasks seeded')
+    parser.add_argument('-r', '--results', type=int, default=1000, help='the number of tasks having a result directory')
+    parser.add_argument('-n', '--count', type=int, default=20, help='the number of requests per API')
+    parser.add_argument('-d', '--days', type=int, default=30, help='the tasks are spread over the last days')
+    args = parser.parse_args()
+    run(args.tasks, args.results, args.count, args.days)
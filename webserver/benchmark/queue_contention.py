@@ -0,0 +1,61 @@
+"""
+Measure TaskQueue.pop under contention, N threads pop from the same queue until it drains
+"""
+import argparse
+import threading
+import time
+import uuid
+
+from app.main.model.database import Endpoint, Organization, Task, TaskQueue
+
+from . import setup_app, teardown_app, report
+
+
+def run(threads, count):
+    app, client = setup_app()
+    organization = Organization(name='benchmark')
+    organization.save()
+    endpoint = Endpoint(name='benchmark', uid=uuid.uuid4(), organization=organization)
+    endpoint.save()
+    taskqueue = TaskQueue(endpoint=endpoint, organization=organization)
+    taskqueue.save()
+    tasks = [Task(test_suite='benchmark', organization=organization) for i in range(count)]
+    Task.objects.insert(tasks)
+    taskqueue.modify(push_all__tasks=tasks)
+
+    popped = []
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        queue = TaskQueue.objects(pk=taskqueue.pk).first()
+        while True:
+            start = time.perf_counter()
+            task = queue.pop()
+            elapsed = time.perf_counter() - start
+            if not task:
+                break
+            with lock:
+                popped.append(task.id)
+                latencies.append(elapsed)
+
+    workers = [threading.Thread(target=worker) for i in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    print('{} threads popped {} tasks in {:.3f}s, {:.0f} pops/s'.format(threads, len(popped), elapsed, len(popped) / elapsed))
+    if len(popped) != count or len(set(popped)) != count:
+        print('ERROR: expected {} distinct tasks, got {} pops of {} distinct tasks'.format(count, len(popped), len(set(popped))))
+    report('pop latency', latencies)
+    teardown_app(client)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--threads', type=int, default=16, help='the number of threads popping concurrently')
+    parser.add_argument('-n', '--count', type=int, default=2000, help='the number of tasks in the queue')
+    args = parser.parse_args()
+    run(args.threads, args.count)
@@ -0,0 +1,69 @@
+"""
+Measure the console log throughput of a synthetic chatty robot run, in lines per second and emits per run
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+
+from task_runner.runner import stream_robot_output
+
+CHATTY_ROBOT = '''
+import sys
+line = 'Keyword | PASS | ' + 'x' * {width} + '\\n'
+for i in range({lines}):
+    sys.stdout.write(line)
+'''
+
+
+def stream_per_byte(stream, on_output):
+    # how the output was consumed before, one emit per character
+    while True:
+        c = stream.read(1)
+        if not c:
+            break
+        try:
+            c = c.decode(encoding=sys.getdefaultencoding())
+        except UnicodeDecodeError:
+            pass
+        else:
+            on_output('\r\n' if c == '\n' else c)
+
+def run_once(batched, lines, width):
+    emits = 0
+    received = 0
+
+    def on_output(message):
+        nonlocal emits, received
+        emits += 1
+        received += message.count('\n')
+
+    args = [sys.executable, '-c', CHATTY_ROBOT.format(lines=lines, width=width)]
+    start = time.perf_counter()
+    if batched:
+        async def stream():
+            p = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+            await stream_robot_output(p.stdout, on_output)
+            await p.wait()
+        asyncio.run(stream())
+    else:
+        p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0)
+        stream_per_byte(p.stdout, on_output)
+        p.wait()
+    elapsed = time.perf_counter() - start
+    return received, emits, elapsed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--lines', type=int, default=200000, help='the number of lines the robot process prints')
+    parser.add_argument('-w', '--width', type=int, default=80, help='the width of each line')
+    parser.add_argument('--per-byte', action='store_true', help='also measure the old per-byte reader')
+    args = parser.parse_args()
+
+    streamers = [('batched', True)]
+    if args.per_byte:
+        streamers.append(('per-byte', False))
+    for name, batched in streamers:
+        lines, emits, elapsed = run_once(batched, args.lines, args.width)
+        print('{}: {} lines in {:.3f}s, {:.0f} lines/s, {} emits'.format(name, lines, elapsed, lines / elapsed, emits))
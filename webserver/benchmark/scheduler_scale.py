@@ -0,0 +1,102 @@
+"""
+Scale test of the endpoint scheduler with simulated endpoints, each has its own priority queues
+
+Checks that every endpoint runs its tasks one at a time in strict priority order and that the
+global cap of running tasks is respected.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from task_runner.util.scheduler import EndpointScheduler
+
+App = namedtuple('App', ['logger'])
+
+
+class SimulatedEndpoint():
+    def __init__(self, name, duration, spawn):
+        self.name = name
+        self.duration = duration
+        self.spawn = spawn
+        self.queues = {3: [], 2: [], 1: []}
+        self.lock = threading.Lock()
+        self.history = []
+        self.running = False
+
+    def push(self, priority, task):
+        with self.lock:
+            self.queues[priority].append(task)
+
+    def pop(self):
+        with self.lock:
+            for priority in sorted(self.queues, reverse=True):
+                if self.queues[priority]:
+                    return priority, self.queues[priority].pop(0)
+        return None
+
+    async def process_next(self, stats):
+        item = self.pop()
+        if not item:
+            return False
+        if self.running:
+            stats['overlapped'] += 1
+        self.running = True
+        stats['running'] += 1
+        stats['peak'] = max(stats['peak'], stats['running'])
+        if self.spawn:
+            p = await asyncio.create_subprocess_exec(sys.executable, '-c', 'import time; time.sleep({})'.format(self.duration))
+            await p.wait()
+        else:
+            await asyncio.sleep(self.duration)
+        stats['running'] -= 1
+        self.running = False
+        self.history.append(item)
+        return True
+
+def run(endpoints, tasks, max_running, duration, spawn):
+    scheduler = EndpointScheduler(max_running)
+    scheduler.start(App(logging.getLogger('scheduler')))
+    stats = {'running': 0, 'peak': 0, 'overlapped': 0}
+    sites = [SimulatedEndpoint('endpoint{}'.format(i), duration, spawn) for i in range(endpoints)]
+
+    start = time.perf_counter()
+    for site in sites:
+        # queue up everything before the first dispatch so that the priority order is deterministic
+        for i in range(tasks):
+            site.push(random.choice((1, 2, 3)), i)
+    for site in sites:
+        scheduler.schedule(site.name, lambda site=site: site.process_next(stats))
+    while any(len(site.history) < tasks for site in sites):
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    misordered = 0
+    for site in sites:
+        priorities = [priority for priority, task in site.history]
+        if priorities != sorted(priorities, reverse=True):
+            misordered += 1
+        for priority in (1, 2, 3):
+            ordered = [task for p, task in site.history if p == priority]
+            if ordered != sorted(ordered):
+                misordered += 1
+
+    total = endpoints * tasks
+    print('{} endpoints ran {} tasks in {:.3f}s, {:.0f} tasks/s, {} threads alive'.format(
+        endpoints, total, elapsed, total / elapsed, threading.active_count()))
+    print('peak running tasks {} (cap {}), overlapped runs on one endpoint {}, misordered endpoints {}'.format(
+        stats['peak'], max_running, stats['overlapped'], misordered))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-e', '--endpoints', type=int, default=500, help='the number of simulated endpoints')
+    parser.add_argument('-n', '--tasks', type=int, default=10, help='the number of tasks queued per endpoint')
+    parser.add_argument('-c', '--max-running', type=int, default=100, help='the global cap of running tasks')
+    parser.add_argument('-d', '--duration', type=float, default=0.05, help='the duration in seconds of each task')
+    parser.add_argument('--spawn', action='store_true', help='run each task as a python subprocess instead of a sleep')
+    args = parser.parse_args()
+    run(args.endpoints, args.tasks, args.max_running, args.duration, args.spawn)
@@ -9,7 +9,10 @@ from flask_cors import CORS
 
 from app import blueprint
 from app.main import create_app
-from mongoengine import connect
+from mongoengine import connect, Document
+from app.main.model import database
+from app.main.util.get_path import get_test_results_root
+from bson import ObjectId
 from app.main.config import get_config
 from task_runner.runner import start_event_thread, start_heartbeat_thread, start_rpc_proxy, initialize_runner, install_sio
 from flask_socketio import SocketIO, send, emit
@@ -35,15 +38,56 @@ manager = Manager(app)
 @manager.command
 def run():
     connect(get_config().MONGODB_DATABASE, host=get_config().MONGODB_URL, port=get_config().MONGODB_PORT)
+    database.Test.drop_duplicates()
     # workaround for dual runnings of the server
     if 'WERKZEUG_RUN_MAIN' in os.environ and os.environ['WERKZEUG_RUN_MAIN'] == 'true':
         start_event_thread(app)
         start_heartbeat_thread(app)
         start_rpc_proxy(app)
         initialize_runner()
+        database.BlacklistToken.load_cache()
     #app.run(host='0.0.0.0')
     socketio.run(app, host='0.0.0.0')
 
+@manager.option('-c', '--check', dest='check', action='store_true', help='Only validate the indexes without building them')
+def indexes(check=False):
+    """Builds the indexes declared by the documents, or validates them with --check."""
+    connect(get_config().MONGODB_DATABASE, host=get_config().MONGODB_URL, port=get_config().MONGODB_PORT)
+    documents = [d for d in vars(database).values() if isinstance(d, type) and issubclass(d, Document) and d is not Document]
+    ret = 0
+    if not check:
+        database.Test.drop_duplicates()
+    for document in documents:
+        if not check:
+            document.ensure_indexes()
+        result = document.compare_indexes()
+        for index in result['missing']:
+            print('{}: missing index {}'.format(document._get_collection_name(), index))
+            ret = 1
+        for index in result['extra']:
+            print('{}: undeclared index {}'.format(document._get_collection_name(), index))
+    return ret
+
+@manager.command
+def rollup():
+    """Rebuilds the daily rollup of the finished tasks."""
+    connect(get_config().MONGODB_DATABASE, host=get_config().MONGODB_URL, port=get_config().MONGODB_PORT)
+    print('{} daily statistics rebuilt'.format(database.TaskStat.rebuild()))
+
+@manager.command
+def flag_results():
+    """Flags the tasks having a test result directory, needed once for the tasks run by the old versions."""
+    connect(get_config().MONGODB_DATABASE, host=get_config().MONGODB_URL, port=get_config().MONGODB_PORT)
+    roots = [get_test_results_root(organization=organization) for organization in database.Organization.objects()]
+    roots.extend(get_test_results_root(team=team, organization=team.organization) for team in database.Team.objects())
+    for root in roots:
+        try:
+            task_ids = [d for d in os.listdir(root) if ObjectId.is_valid(d)]
+        except FileNotFoundError:
+            continue
+        cnt = database.Task.objects(pk__in=task_ids, has_results__ne=True).update(has_results=True)
+        print('{}: {} tasks flagged'.format(root, cnt))
+
 @manager.command
 def test():
     """Runs the unit tests."""
@@ -1,6 +1,7 @@
 import argparse
 import asyncio
-import chardet
+import codecs
+import concurrent.futures
 import datetime
 import functools
 import json
@@ -15,8 +16,7 @@ import tarfile
 import threading
 import time
 import traceback
-import xmlrpc.client
-from io import StringIO
+import zlib
 from pathlib import Path
 
 import eventlet
@@ -24,16 +24,20 @@ import mongoengine
 import websockets
 from mongoengine import ValidationError
 from app.main.config import get_config
-from app.main.model.database import Endpoint, Task, TaskQueue, EventQueue, Organization, Team, \
-        EVENT_CODE_CANCEL_TASK, EVENT_CODE_START_TASK, EVENT_CODE_UPDATE_USER_SCRIPT, QUEUE_PRIORITY
-from app.main.util import get_room_id
+from app.main.model.database import Endpoint, Task, TaskQueue, TaskStat, EventQueue, Organization, Team, \
+        EVENT_CODE_CANCEL_TASK, EVENT_CODE_START_TASK, EVENT_CODE_UPDATE_USER_SCRIPT
+from app.main.util import get_room_id, EVENT_PUSHED
 from app.main.util.get_path import get_test_result_path, get_upload_files_root, get_user_scripts_root
 from app.main.util.tarball import make_tarfile_from_dir
 from bson import DBRef, ObjectId
 from mongoengine import connect
 from sanic import Sanic
 from sanic.websocket import WebSocketProtocol
+from task_runner.libraries.WebsocketRemote import decode_value, encode_value
 from task_runner.util.dbhelper import db_update_test
+from task_runner.util.logbuffer import LogBuffer
+from task_runner.util.scheduler import EndpointScheduler
+from app.main.util.ttlcache import TTLCache
 from task_runner.util.notification import (notification_chain_call,
                                            notification_chain_init)
 from task_runner.util.xmlrpcserver import XMLRPCServer
@@ -42,21 +46,45 @@ from asyncio.exceptions import CancelledError
 from sanic.websocket import ConnectionClosed
 
 ROBOT_PROCESSES = {}  # {task id: process instance}
-TASK_THREADS = {}     # {taskqueue id: idle counter (int)}}
-TASK_LOCK = threading.Lock()
-ROOM_MESSAGES = {}  # {"organziation:team": old_message, new_message}
+TASK_SCHEDULER = EndpointScheduler(get_config().MAX_RUNNING_TASKS)
+ROOM_MESSAGES = {}  # {"organziation:team": {task id: LogBuffer}}
 RPC_PROXIES = {}    # {"endpoint_id": (websocket, rpc)}
+RPC_WEBSOCKETS = {} # {url of RPC_PROXIES: websocket}
 RPC_SOCKET = None
-TASKS_CACHED = {}
+TASK_ROOMS = TTLCache(maxsize=4096, ttl=24 * 3600)  # {task id: room id}
 
 RPC_APP = Sanic('RPC Proxy app')
 
+# events pushed by other processes don't trigger EVENT_PUSHED, poll the queue at this interval as a fallback
+EVENT_POLL_INTERVAL = 5
+
+# console output of robot processes is read in chunks and emitted in batches bounded by size and time
+ROBOT_OUTPUT_ENCODING = sys.getdefaultencoding()
+ROBOT_OUTPUT_CHUNK_SIZE = 4096
+ROBOT_OUTPUT_FLUSH_SIZE = 16 * 1024
+ROBOT_OUTPUT_FLUSH_INTERVAL = 0.1
+ROBOT_POLL_INTERVAL = 0.2  # seconds between the checks whether a robot process has exited
+
+RPC_PORT = 5555
+ROBOT_LIBRARIES_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'libraries')
+KEYWORD_METHODS = ('get_keyword_names', 'run_keyword', 'get_keyword_arguments', 'get_keyword_documentation', 'get_keyword_tags')
+STOP_REMOTE_SERVER_REPLIES = {
+    'get_keyword_arguments': [],
+    'get_keyword_tags': [],
+    'get_keyword_documentation': 'Stop the remote server unless stopping is disabled.\n\n'
+                                 'Return ``True/False`` depending was server stopped or not.',
+}
+
+# endpoints are probed by pinging the websockets of their RPC daemons
+HEARTBEAT_INTERVAL = 30
+HEARTBEAT_TIMEOUT = 5
+
 def install_sio(sio):
     global RPC_SOCKET
     RPC_SOCKET = sio
 
 def event_handler_cancel_task(app, event):
-    global ROBOT_PROCESSES, TASK_THREADS
+    global ROBOT_PROCESSES
     endpoint_uid = event.message['endpoint_uid']
     priority = event.message['priority']
     task_id = event.message['task_id']
@@ -87,7 +115,7 @@ def event_handler_cancel_task(app, event):
         return
 
     if task.status == 'waiting':
-        if taskqueue.running_task and taskqueue.running_task.id == task.id and str(endpoint.id) in TASK_THREADS:
+        if taskqueue.running_task and taskqueue.running_task.id == task.id and TASK_SCHEDULER.is_running(str(endpoint.id)):
             app.logger.critical('Waiting task to run')
             for i in range(20):
                 task.reload('status')
@@ -105,13 +133,13 @@ def event_handler_cancel_task(app, event):
             app.logger.info('Waiting task cancelled without process running')
             return
     if task.status == 'running':
-        if str(endpoint.id) in TASK_THREADS:
+        if TASK_SCHEDULER.is_running(str(endpoint.id)):
             if task.id in ROBOT_PROCESSES:
                 taskqueue.modify(running_task=None)
                 task.modify(status='cancelled')
 
                 #os.kill(ROBOT_PROCESSES[task.id].pid, signal.CTRL_C_EVENT)
-                ROBOT_PROCESSES[task.id].terminate()
+                TASK_SCHEDULER.call_soon(ROBOT_PROCESSES[task.id].terminate)
                 # del ROBOT_PROCESSES[task.id]  # will be done in the task loop when robot process exits
                 app.logger.info('Running task cancelled with process running')
                 return
@@ -134,20 +162,7 @@ def event_handler_start_task(app, event):
             app.logger.error('Endpoint not found for {}@{}'.format(org_name, endpoint_uid))
         return
 
-    endpoint_id = str(endpoint.id)
-    TASK_LOCK.acquire()
-    if endpoint_id not in TASK_THREADS:
-        TASK_THREADS[endpoint_id] = 1
-        TASK_LOCK.release()
-        reset_task_queue_status(app, organization, team)
-        thread = threading.Thread(target=process_task_per_endpoint, args=(app, endpoint, organization, team), name='task_thread_per_endpoint')
-        thread.daemon = True
-        thread.start()
-        #del TASK_THREADS[endpoint_id]  ## will delete when task loop exits
-    else:
-        TASK_THREADS[endpoint_id] = 2
-        TASK_LOCK.release()
-        app.logger.info('Schedule the task to the pending queue')
+    TASK_SCHEDULER.schedule(str(endpoint.id), functools.partial(process_task_per_endpoint, app, endpoint, organization, team))
 
 def event_handler_update_user_script(app, event):
     # TODO:
@@ -170,9 +185,11 @@ def event_loop(app):
     app.logger.info('Event loop started')
 
     while True:
+        # clear the flag before popping, an event pushed in between will wake up the wait below at once
+        EVENT_PUSHED.clear()
         event = eventqueue.pop()
         if not event:
-            time.sleep(1)
+            EVENT_PUSHED.wait(EVENT_POLL_INTERVAL)
             continue
 
         if isinstance(event, DBRef):
@@ -246,217 +263,306 @@ def convert_json_to_robot_variable(args, variables, variable_file):
 
     args.extend(['--variablefile', str(variable_file)])
 
-def process_task_per_endpoint(app, endpoint, organization=None, team=None):
-    global ROBOT_PROCESSES, TASKS_CACHED
-
-    if not organization and not team:
-        app.logger.error('Argument organization and team must neither be None')
-        return
-    room_id = get_room_id(str(organization.id), str(team.id) if team else '')
-
-    taskqueues = TaskQueue.objects(organization=organization, team=team, endpoint=endpoint)
-    if taskqueues.count() == 0:
-        app.logger.error('Taskqueue not found')
-        return
-    # taskqueues = [q for q in taskqueues]  # query becomes stale if the document it points to gets changed elsewhere, use document instead of query to perform deletion
-    taskqueue_first = taskqueues.first()
+class PipeReader():
+    """
+    Read the pipe of a subprocess.Popen in the executor, for stream_robot_output
 
-    endpoint_id = str(endpoint.id)
-    endpoint_uid = endpoint.uid
-    org_name = team.organization.name + '-' + team.name if team else organization.name
+    Under eventlet the pipe and the executor threads are green, so a read never blocks the hub. A read
+    interrupted by a timeout keeps running, its data is returned by the next read.
+    """
+    def __init__(self, pipe, loop):
+        self.pipe = pipe
+        self.loop = loop
+        self._pending = None
+
+    async def read(self, n):
+        if not self._pending:
+            self._pending = self.loop.run_in_executor(None, self.pipe.read, n)
+        data = await asyncio.shield(self._pending)
+        self._pending = None
+        return data
+
+async def stream_robot_output(stream, on_output, chunk_size=ROBOT_OUTPUT_CHUNK_SIZE,
+                              flush_size=ROBOT_OUTPUT_FLUSH_SIZE, flush_interval=ROBOT_OUTPUT_FLUSH_INTERVAL):
+    """
+    Read the console output of a robot process until EOF and pass the decoded text to on_output in batches
 
+    A batch is flushed once it reaches flush_size characters or has been held for flush_interval seconds,
+    so a quiet process still gets its output delivered promptly. on_output may be a coroutine function, it is
+    awaited before the next batch so that the batches are delivered in order.
+    """
+    loop = asyncio.get_event_loop()
+    decoder = codecs.getincrementaldecoder(ROBOT_OUTPUT_ENCODING)(errors='replace')
+    batch = []
+    batch_size = 0
+    deadline = None
     while True:
-        taskqueue_first.reload('to_delete')
-        if taskqueue_first.to_delete:
-            taskqueues.delete()
-            endpoint.delete()
-            app.logger.info('Abort the task loop: {} @ {}'.format(org_name, endpoint_uid))
+        try:
+            data = await asyncio.wait_for(stream.read(chunk_size), max(0, deadline - loop.time()) if batch else None)
+        except asyncio.TimeoutError:
+            data = None
+        if data is None:
+            text = ''
+        else:
+            text = decoder.decode(data, final=not data)
+        if text:
+            if not batch:
+                deadline = loop.time() + flush_interval
+            batch.append(text)
+            batch_size += len(text)
+        if batch and (not data or batch_size >= flush_size or loop.time() >= deadline):
+            ret = on_output(''.join(batch).replace('\n', '\r\n'))
+            if asyncio.iscoroutine(ret):
+                await ret
+            batch = []
+            batch_size = 0
+        if data == b'':
             break
-        # TODO: lower priority tasks will take precedence if higher priority queue is empty first
-        # but filled then when thread is searching for tasks in the lower priority task queues
-        for priority in QUEUE_PRIORITY:
-            exit_task = False
-            for taskqueue in taskqueues:
-                taskqueue.reload('to_delete')
-                if taskqueue.to_delete:
-                    exit_task = True
-                    break
-                if taskqueue.priority == priority:
-                    break
-            else:
-                app.logger.error('Found task queue with unknown priority')
-                continue
-
-            if exit_task:
-                break
-
-            # "continue" to search for tasks in the lower priority task queues
-            # "break" to start over to search for tasks from the top priority task queue
-            task = taskqueue.pop()
-            if not task:
-                continue
-            task_id = str(task.id)
-            if isinstance(task, DBRef):
-                app.logger.warning('task {} has been deleted, ignore it'.format(task_id))
-                taskqueue.modify(running_task=None)
-                break
 
-            if task.kickedoff != 0 and not task.parallelization:
-                app.logger.info('task has been taken over by other threads, do nothing')
-                taskqueue.modify(running_task=None)
-                break
+def pick_task(app, endpoint, organization, team):
+    """
+    Pop the task to run next from the task queues of the endpoint in strict priority order
 
-            task.modify(inc__kickedoff=1)
-            if task.kickedoff != 1 and not task.parallelization:
-                app.logger.warning('a race condition happened')
-                taskqueue.modify(running_task=None)
-                break
+    Return (True, taskqueue, task) with the task to run, (True, None, None) if the queues should be checked again,
+    or (False, None, None) if there is nothing left to run
+    """
+    taskqueues = TaskQueue.objects(organization=organization, team=team, endpoint=endpoint).only('to_delete')
+    to_delete = [q.to_delete for q in taskqueues]
+    if len(to_delete) == 0:
+        app.logger.error('Taskqueue not found')
+        return False, None, None
+    if any(to_delete):
+        org_name = team.organization.name + '-' + team.name if team else organization.name
+        taskqueues.delete()
+        endpoint.delete()
+        app.logger.info('Abort the task loop: {} @ {}'.format(org_name, endpoint.uid))
+        return False, None, None
 
-            app.logger.info('Start to run task {} in the thread {}'.format(task_id, threading.current_thread().name))
+    taskqueue, task = TaskQueue.pop_highest(endpoint, organization, team)
+    if not task:
+        return False, None, None
+    task_id = str(task.id)
+    if isinstance(task, DBRef):
+        app.logger.warning('task {} has been deleted, ignore it'.format(task_id))
+        taskqueue.modify(running_task=None)
+        return True, None, None
 
-            result_dir = get_test_result_path(task)
-            scripts_dir = get_user_scripts_root(task)
-            args = ['robot', '--loglevel', 'debug', '--outputdir', str(result_dir), '--extension', 'md',
-                    '--consolecolors', 'on', '--consolemarkers', 'on']
-            os.makedirs(result_dir)
+    if task.kickedoff != 0 and not task.parallelization:
+        app.logger.info('task has been taken over by other threads, do nothing')
+        taskqueue.modify(running_task=None)
+        return True, None, None
+
+    task.modify(inc__kickedoff=1)
+    if task.kickedoff != 1 and not task.parallelization:
+        app.logger.warning('a race condition happened')
+        taskqueue.modify(running_task=None)
+        return True, None, None
+
+    return True, taskqueue, task
+
+def prepare_robot_args(app, task, endpoint):
+    result_dir = get_test_result_path(task)
+    scripts_dir = get_user_scripts_root(task)
+    args = ['robot', '--loglevel', 'debug', '--outputdir', str(result_dir), '--extension', 'md',
+            '--consolecolors', 'on', '--consolemarkers', 'on']
+    os.makedirs(result_dir)
+
+    if hasattr(task, 'testcases'):
+        for t in task.testcases:
+            args.extend(['-t', t])
+
+    if hasattr(task, 'variables'):
+        variable_file = Path(result_dir) / 'variablefile.py'
+        convert_json_to_robot_variable(args, task.variables, variable_file)
+
+    addr, port = '127.0.0.1', 8270
+    args.extend(['-v', f'address_daemon:{addr}', '-v', f'port_daemon:{port}',
+                '-v', f'task_id:{task.id}', '-v', f'endpoint_uid:{endpoint.uid}',
+                '-v', f'keyword_daemon:ws://{addr}:{RPC_PORT}/keyword', '--pythonpath', ROBOT_LIBRARIES_ROOT])
+    args.append(os.path.join(scripts_dir, task.test.path, task.test.test_suite + '.md'))
+    app.logger.info('Arguments: ' + str(args))
+    return args, result_dir
+
+def mark_task_running(task, endpoint):
+    task.status = 'running'
+    # a parallelized task keeps the run date of its first run, which it's counted into the statistics by
+    if not task.parallelization or not task.run_date:
+        task.run_date = datetime.datetime.utcnow()
+    task.endpoint_run = endpoint
+    task.has_results = True
+    task.save()
+
+def finish_task(app, task, taskqueue, endpoint, returncode, result_dir):
+    if returncode == 0:
+        task.status = 'successful'
+    else:
+        task.reload('status')
+        if task.status != 'cancelled':
+            task.status = 'failed'
+    task.save()
+    TaskStat.count_task(task)
 
-            if hasattr(task, 'testcases'):
-                for t in task.testcases:
-                    args.extend(['-t', t])
+    taskqueue.modify(running_task=None)
+    endpoint.modify(last_run_date=datetime.datetime.utcnow())
 
-            if hasattr(task, 'variables'):
-                variable_file = Path(result_dir) / 'variablefile.py'
-                convert_json_to_robot_variable(args, task.variables, variable_file)
+    if task.upload_dir:
+        resource_dir_tmp = get_upload_files_root(task)
+        if os.path.exists(resource_dir_tmp):
+            make_tarfile_from_dir(str(result_dir / 'resource.tar.gz'), resource_dir_tmp)
 
-            addr, port = '127.0.0.1', 8270
-            args.extend(['-v', f'address_daemon:{addr}', '-v', f'port_daemon:{port}',
-                        '-v', f'task_id:{task_id}', '-v', f'endpoint_uid:{endpoint_uid}'])
-            args.append(os.path.join(scripts_dir, task.test.path, task.test.test_suite + '.md'))
-            app.logger.info('Arguments: ' + str(args))
+    result_dir_tmp = result_dir / 'temp'
+    if os.path.exists(result_dir_tmp):
+        shutil.rmtree(result_dir_tmp)
 
-            p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0,
-                                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0)
-            ROBOT_PROCESSES[task.id] = p
+    notification_chain_call(task)
 
-            task.status = 'running'
-            task.run_date = datetime.datetime.utcnow()
-            task.endpoint_run = endpoint
+def abort_task(app, task, taskqueue):
+    """
+    Fail a task that didn't run to the end and release its task queue, so the endpoint is not blocked
+    """
+    try:
+        task.reload('status')
+        if task.status != 'cancelled':
+            task.status = 'failed'
             task.save()
-            RPC_SOCKET.emit('task started', {'task_id': task_id}, room=room_id)
+            TaskStat.count_task(task)
+    except Exception as e:
+        app.logger.exception(e)
+    taskqueue.modify(running_task=None)
 
-            log_msg = StringIO()
-            if room_id not in ROOM_MESSAGES:
-                ROOM_MESSAGES[room_id] = {task_id: log_msg}
-            else:
-                if task_id not in ROOM_MESSAGES[room_id]:
-                    ROOM_MESSAGES[room_id][task_id] = log_msg
-            ss = b''
-            while True:
-                c = p.stdout.read(1)
-                if not c:
-                    break
-                try:
-                    c = c.decode(encoding=sys.getdefaultencoding())
-                except UnicodeDecodeError:
-                    ss += c
-                else:
-                    c = '\r\n' if c == '\n' else c
-                    log_msg.write(c)
-                    RPC_SOCKET.emit('test report', {'task_id': task_id, 'message': c}, room=room_id)
-            del ROBOT_PROCESSES[task.id]
-
-            if ss != b'':
-                ss = ss.decode(chardet.detect(ss)['encoding'])
-                log_msg_all = StringIO()
-                log_msg_all.write(ss)
-                log_msg_all.write(log_msg.getvalue())
-                app.logger.info('\n' + log_msg_all.getvalue())
-                RPC_SOCKET.emit('test report', {'task_id': task_id, 'message': ss}, room=room_id)
-            else:
-                app.logger.info('\n' + log_msg.getvalue())
-            #app.logger.info('\n' + log_msg.getvalue().replace('\r\n', '\n'))
+def write_output(log_msg, task_id, room_id, message):
+    log_msg.write(message)
+    RPC_SOCKET.emit('test report', {'task_id': task_id, 'message': message}, room=room_id)
 
-            p.wait()
-            if p.returncode == 0:
-                task.status = 'successful'
-            else:
-                task.reload('status')
-                if task.status != 'cancelled':
-                    task.status = 'failed'
-            task.save()
-            RPC_SOCKET.emit('task finished', {'task_id': task_id, 'status': task.status}, room=room_id)
-            ROOM_MESSAGES[room_id][task_id].close()
-            del ROOM_MESSAGES[room_id][task_id]
-            if task_id in TASKS_CACHED:
-                del TASKS_CACHED[task_id]
+async def process_task_per_endpoint(app, endpoint, organization=None, team=None):
+    """
+    Run the next task of the endpoint
 
-            taskqueue.modify(running_task=None)
-            endpoint.modify(last_run_date=datetime.datetime.utcnow())
+    Return True if the task queues of the endpoint should be checked again, False if nothing is left to run
+    """
+    global ROBOT_PROCESSES
+
+    if not organization and not team:
+        app.logger.error('Argument organization and team must neither be None')
+        return False
+    room_id = get_room_id(str(organization.id), str(team.id) if team else '')
+    loop = asyncio.get_event_loop()
 
-            if task.upload_dir:
-                resource_dir_tmp = get_upload_files_root(task)
-                if os.path.exists(resource_dir_tmp):
-                    make_tarfile_from_dir(str(result_dir / 'resource.tar.gz'), resource_dir_tmp)
+    more, taskqueue, task = await loop.run_in_executor(None, pick_task, app, endpoint, organization, team)
+    if not task:
+        return more
+    task_id = str(task.id)
 
-            result_dir_tmp = result_dir / 'temp'
-            if os.path.exists(result_dir_tmp):
-                shutil.rmtree(result_dir_tmp)
+    p = None
+    log_msg = None
+    finished = False
+    try:
+        app.logger.info('Start to run task {} for the endpoint {}'.format(task_id, endpoint.uid))
+        args, result_dir = await loop.run_in_executor(None, prepare_robot_args, app, task, endpoint)
 
-            notification_chain_call(task)
-            TASK_LOCK.acquire()
-            TASK_THREADS[endpoint_id] = 1
-            TASK_LOCK.release()
-            break
+        # not asyncio.create_subprocess_exec, its child watcher blocks the eventlet hub in os.waitpid
+        p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0,
+                            creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0)
+        ROBOT_PROCESSES[task.id] = p
+
+        await loop.run_in_executor(None, mark_task_running, task, endpoint)
+        RPC_SOCKET.emit('task started', {'task_id': task_id}, room=room_id)
+
+        log_msg = LogBuffer(result_dir / 'console.log')
+        if room_id not in ROOM_MESSAGES:
+            ROOM_MESSAGES[room_id] = {task_id: log_msg}
         else:
-            TASK_LOCK.acquire()
-            if TASK_THREADS[endpoint_id] != 1:
-                TASK_THREADS[endpoint_id] = 1
-                TASK_LOCK.release()
-                app.logger.info('Run the lately scheduled task')
-                continue
-            del TASK_THREADS[endpoint_id]
-            TASK_LOCK.release()
-            break
+            if task_id not in ROOM_MESSAGES[room_id]:
+                ROOM_MESSAGES[room_id][task_id] = log_msg
 
-def check_endpoint(app, endpoint_uid, organization, team):
-    org_name = team.organization.name + '-' + team.name if team else organization.name
-    url = 'http://127.0.0.1:8270/{}'.format(endpoint_uid)
-    server = xmlrpc.client.ServerProxy(url)
-    endpoint = Endpoint.objects(uid=endpoint_uid, organization=organization, team=team).first()
-    try:
-        ret = server.get_keyword_names()
-    except ConnectionRefusedError:
-        err_msg = 'Endpoint {} @ {} connecting failed'.format(endpoint.name, org_name)
-    except xmlrpc.client.Fault as e:
-        err_msg = 'Endpoint {} @ {} RPC calling error'.format(endpoint.name, org_name)
-        app.logger.exception(e)
-    except TimeoutError:
-        err_msg = 'Endpoint {} @ {} connecting timeouted'.format(endpoint.name, org_name)
-    except OSError as e:
-        err_msg = 'Endpoint {} @ {} unreachable'.format(endpoint.name, org_name)
+        async def emit_output(message):
+            await loop.run_in_executor(None, write_output, log_msg, task_id, room_id, message)
+
+        await stream_robot_output(PipeReader(p.stdout, loop), emit_output)
+        while p.poll() is None:
+            await asyncio.sleep(ROBOT_POLL_INTERVAL)
+        app.logger.info('Console log of task {} saved to {}'.format(task_id, log_msg.path))
+
+        await loop.run_in_executor(None, finish_task, app, task, taskqueue, endpoint, p.returncode, result_dir)
+        finished = True
+        RPC_SOCKET.emit('task finished', {'task_id': task_id, 'status': task.status}, room=room_id)
     except Exception as e:
-        err_msg = 'Endpoint {} @ {} has error:'.format(endpoint.name, org_name)
+        app.logger.error('Failed to run task {}'.format(task_id))
         app.logger.exception(e)
-    else:
-        if ret:
-            if endpoint and endpoint.status == 'Offline':
-                endpoint.modify(status='Online')
-            return True
-        else:
-            err_msg = 'Endpoint {} @ {} RPC proxy not found'.format(endpoint.name, org_name)
-    if endpoint and endpoint.status == 'Online':
-        app.logger.error(err_msg)
-        endpoint.modify(status='Offline')
-    return False
+    finally:
+        ROBOT_PROCESSES.pop(task.id, None)
+        if p and p.poll() is None:
+            p.kill()
+        if not finished:
+            await loop.run_in_executor(None, abort_task, app, task, taskqueue)
+            RPC_SOCKET.emit('task finished', {'task_id': task_id, 'status': task.status}, room=room_id)
+        if log_msg:
+            log_msg.close()
+        ROOM_MESSAGES.get(room_id, {}).pop(task_id, None)
+        TASK_ROOMS.pop(task_id, None)
+    return True
+
+async def probe_endpoint(url):
+    """
+    Ping the websocket of an RPC proxy, return whether the pong is received before the deadline
+    """
+    ws = RPC_WEBSOCKETS.get(url, None)
+    if not ws:
+        return False
+    try:
+        pong_waiter = await asyncio.wait_for(ws.ping(), HEARTBEAT_TIMEOUT)
+        await asyncio.wait_for(pong_waiter, HEARTBEAT_TIMEOUT)
+    except (asyncio.TimeoutError, CancelledError, ConnectionClosed):
+        return False
+    return True
+
+def probe_endpoints(endpoint_uids):
+    """
+    Probe the endpoints' RPC daemons concurrently, return a list of whether each endpoint is online
+    """
+    if 'loop' not in RPC_PROXIES:
+        return [False] * len(endpoint_uids)
+
+    async def probe_all():
+        return await asyncio.gather(*(probe_endpoint(normalize_url(str(uid))) for uid in endpoint_uids))
+
+    fut = asyncio.run_coroutine_threadsafe(probe_all(), RPC_PROXIES['loop'])
+    try:
+        return fut.result(HEARTBEAT_TIMEOUT * 2 + 1)
+    except concurrent.futures.TimeoutError:
+        fut.cancel()
+        return [False] * len(endpoint_uids)
+
+def update_endpoint_status(app, endpoints, online):
+    """
+    Write the status changes of the endpoints to the database in two batched updates
+    """
+    online_ids, offline_ids = [], []
+    for endpoint, alive in zip(endpoints, online):
+        if alive and endpoint.status == 'Offline':
+            online_ids.append(endpoint.id)
+        elif not alive and endpoint.status == 'Online':
+            app.logger.error('Endpoint {} ({}) went offline'.format(endpoint.name, endpoint.uid))
+            offline_ids.append(endpoint.id)
+    if online_ids:
+        Endpoint.objects(pk__in=online_ids, status='Offline').update(status='Online')
+    if offline_ids:
+        Endpoint.objects(pk__in=offline_ids, status='Online').update(status='Offline')
+
+def check_endpoint(app, endpoint_uid, organization, team):
+    endpoint = Endpoint.objects(uid=endpoint_uid, organization=organization, team=team).only('uid', 'name', 'status').first()
+    online = probe_endpoints([endpoint_uid])
+    if endpoint:
+        update_endpoint_status(app, [endpoint], online)
+    return online[0]
     
 def heartbeat_monitor(app):
     app.logger.info('Start endpoint online check thread')
-    expires = 0
     while True:
-        endpoints = Endpoint.objects()
-        for endpoint in endpoints:
-            check_endpoint(app, endpoint.uid, endpoint.organization, endpoint.team)
-        time.sleep(30)
+        endpoints = list(Endpoint.objects().only('uid', 'name', 'status'))
+        online = probe_endpoints([endpoint.uid for endpoint in endpoints])
+        update_endpoint_status(app, endpoints, online)
+        time.sleep(HEARTBEAT_INTERVAL)
 
 def normalize_url(url):
     if not url.startswith('/'):
@@ -465,15 +571,32 @@ def normalize_url(url):
         url = url[:-1]
     return url
 
+def get_task_room_id(task_id):
+    """
+    Get the room id of a task, only the organization and team references are fetched on a cache miss
+    """
+    room_id = TASK_ROOMS.get(task_id)
+    if room_id is None:
+        task = Task.objects(pk=task_id).only('organization', 'team').as_pymongo().first()
+        if not task:
+            return None
+        room_id = get_room_id(str(task['organization']), str(task['team']) if task.get('team', None) else '')
+        TASK_ROOMS.set(task_id, room_id)
+    return room_id
+
 @RPC_APP.websocket('/msg')
 async def rpc_message_relay(request, ws):
-    global TASKS_CACHED
     while True:
         try:
             ret = await ws.recv()
+            if isinstance(ret, bytes):
+                # a batch compressed by the endpoint
+                ret = zlib.decompress(ret)
             ret = json.loads(ret)
+        except (CancelledError, ConnectionClosed):
+            return
         except Exception as e:
-            pass
+            continue
         if 'task_id' not in ret:
             return
         task_id = ret['task_id']
@@ -481,14 +604,37 @@ async def rpc_message_relay(request, ws):
             # task daemon's message
             continue
         data = ret['data']
-        if task_id not in TASKS_CACHED:
-            task = Task.objects(pk=task_id).first()
-            TASKS_CACHED[task_id] = task
-        else:
-            task = TASKS_CACHED[task_id]
-        room_id = get_room_id(str(task.organization.id), str(task.team.id) if task.team else '')
+        room_id = get_task_room_id(task_id)
+        if not room_id:
+            continue
         RPC_SOCKET.emit('test log', {'task_id': task_id, 'message': data}, room=room_id)
 
+@RPC_APP.websocket('/keyword/<path:path>')
+async def rpc_keyword_relay(request, ws, path):
+    """
+    Relay the keyword calls of the WebsocketRemote library to the endpoint's RPC proxy, the JSON counterpart of the XML RPC server
+    """
+    url = normalize_url(path)
+    while True:
+        try:
+            call = json.loads(await ws.recv(), object_hook=decode_value)
+        except (CancelledError, ConnectionClosed):
+            return
+        method, args = call.get('method', None), call.get('args', [])
+        reply = {'id': call.get('id', None)}
+        if method not in KEYWORD_METHODS:
+            reply['error'] = 'method "{}" is not supported'.format(method)
+        elif url not in RPC_PROXIES:
+            reply['result'] = [] if method == 'get_keyword_names' else None
+        elif method in STOP_REMOTE_SERVER_REPLIES and args and args[0] == 'stop_remote_server':
+            reply['result'] = STOP_REMOTE_SERVER_REPLIES[method]
+        else:
+            try:
+                reply['result'] = await getattr(RPC_PROXIES[url].request, method)(*args)
+            except Exception as e:
+                reply['error'] = '{}:{}'.format(type(e), e)
+        await ws.send(json.dumps(reply, default=encode_value))
+
 @RPC_APP.websocket('/rpc')
 async def rpc_proxy(request, ws):
     # need to protect from DDos attacking
@@ -535,11 +681,14 @@ async def rpc_proxy(request, ws):
         await RPC_PROXIES[url].close()
         del RPC_PROXIES[url]
     RPC_PROXIES[url] = rpc
+    RPC_WEBSOCKETS[url] = ws
 
     try:
         await ws.wait_closed()
     except (CancelledError, ConnectionClosed):
         pass
+    if RPC_WEBSOCKETS.get(url, None) is ws:
+        del RPC_WEBSOCKETS[url]
     try:
         await RPC_PROXIES[url].close()
     except websockets.exceptions.ConnectionClosedError:
@@ -559,31 +708,11 @@ def reset_event_queue_status(app):
         queue.save()
         app.logger.error('Event queue has not been created')
 
-    ret = queue.modify({'rw_lock': True}, rw_lock=False)
-    if ret:
-        app.logger.info('Reset the read/write lock for event queue')
-
-def reset_task_queue_status(app, organization=None, team=None):
-    queues = TaskQueue.objects(organization=organization, team=team)
-    if queues.count() == 0:
-        app.logger.error('Task queue has not been created')
-        return 1
-    
-    for q in queues:
-        ret = q.modify({'rw_lock': True}, rw_lock=False)
-        if ret:
-            app.logger.info('Reset the read/write lock for queue {} with priority {}'.format(q.endpoint.uid, q.priority))
-    return 0
-
 def prepare_to_run(app, organization=None, team=None):
     ret = reset_event_queue_status(app)
     if ret:
         return ret
 
-    ret = reset_task_queue_status(app, organization, team)
-    if ret:
-        return ret
-
     ret = restart_interrupted_tasks(app, organization, team)
     if ret:
         return ret
@@ -591,6 +720,7 @@ def prepare_to_run(app, organization=None, team=None):
     return 0
 
 def start_event_thread(app):
+    TASK_SCHEDULER.start(app)
     task_thread = threading.Thread(target=event_loop_parent, name='event_loop_parent', args=(app,))
     task_thread.daemon = True
     task_thread.start()
@@ -601,7 +731,7 @@ def start_heartbeat_thread(app):
     thread.start()
 
 def bootstrap_rpc_proxy(app):
-    RPC_APP.run(host='0.0.0.0', port=5555, debug=True, protocol=WebSocketProtocol)
+    RPC_APP.run(host='0.0.0.0', port=RPC_PORT, debug=True, protocol=WebSocketProtocol)
 
 def start_rpc_proxy(app):
     app.logger.info('Start RPC proxy thread')
@@ -613,7 +743,10 @@ def start_rpc_proxy(app):
 
 def start_xmlrpc_server(app):
     app.logger.info('Start local XML RPC server thread')
-    thread = XMLRPCServer(RPC_PROXIES, host='0.0.0.0', port=8270)
+    config = get_config()
+    thread = XMLRPCServer(RPC_PROXIES, host='0.0.0.0', port=8270,
+                          max_workers=config.XMLRPC_MAX_WORKERS,
+                          max_workers_per_path=config.XMLRPC_MAX_WORKERS_PER_PATH)
     thread.daemon = True
     thread.start()
 
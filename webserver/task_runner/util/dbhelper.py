@@ -2,11 +2,14 @@ import argparse
 import copy
 import datetime
 import email
+import hashlib
 import os
 import posixpath
 import re
 import sys
 import shutil
+import time
+import uuid
 import zipfile
 import zipimport
 from io import StringIO
@@ -20,13 +23,16 @@ from distutils import dir_util
 
 import mistune
 from mongoengine import connect
+from pymongo import UpdateOne
 from flask import current_app
 
 sys.path.append('.')
 from app.main.model.database import Test, User
 from app.main.config import get_config
+from app.main.util.bundle_cache import invalidate_tree_digest
 from app.main.util.get_path import get_back_scripts_root, get_user_scripts_root
 from app.main.model.database import Package
+from app.main.util.ttlcache import TTLCache
 
 METADATA = 'METADATA'
 WHEEL_INFO = 'WHEEL'
@@ -38,12 +44,21 @@ WHEEL_INFO_RE = re.compile(
 VERSION_CHECK = re.compile(r'(?P<name>.*?)(?P<compare>\s*(==|>=|<=|!=)\s*)?(?P<version>\d.+?)?$').match
 MODULE_IMPORT = re.compile(r'^\s*(import|from)\s+(?P<module>.+?)(#|$|\s+import\s+.+$)').match
 
-def filter_kw(item):
+INSTALL_STAGING = '.installing'     # where packages are extracted, next to the scripts roots to be renamed into them
+INSTALL_STAGING_TIMEOUT = 3600      # seconds after which a staging directory is considered to be left by a crash
+PACKAGE_COPY_SIZE = 64 * 1024
+
+MD_PARSE_CACHE = TTLCache(maxsize=get_config().MD_PARSE_CACHE_SIZE, ttl=24 * 3600)  # {sha1 of a markdown file: (test cases, variables, errors)}
+
+def filter_kw(item, errors=None):
     item = item.strip()
     if item.startswith('${') or item.startswith('@{') or item.startswith('&{'):
         item = item[2:]
         if not item.endswith('}'):
-            current_app.logger.error('{ } mismatch for ' + item)
+            if errors is None:
+                current_app.logger.error('{ } mismatch for ' + item)
+            else:
+                errors.append('{ } mismatch for ' + item)
         else:
             item = item[0:-1]
     return item
@@ -161,32 +176,104 @@ def install_test_suite(package, user, organization, team, pypi_root, proprietary
 
     scripts_root = get_user_scripts_root(organization=organization, team=team)
     libraries_root = get_back_scripts_root(organization=organization, team=team)
-    with zipfile.ZipFile(pkg_file) as zf:
-        for f in zf.namelist():
-            if f.startswith('EGG-INFO'):
-                continue
-            dirname = os.path.dirname(f)
-            if os.path.exists(scripts_root / dirname):
-                shutil.rmtree(scripts_root / dirname)
-            if os.path.exists(libraries_root / dirname):
-                shutil.rmtree(libraries_root / dirname)
-
-    with zipfile.ZipFile(pkg_file) as zf:
-        libraries = (f for f in zf.namelist() if not f.startswith('EGG-INFO') and '/scripts/' not in f)
-        for l in libraries:
-            zf.extract(l, libraries_root)
-        scripts = [f for f in zf.namelist() if '/scripts/' in f]
-        for s in scripts:
-            zf.extract(s, scripts_root)
-        for pkg_name in set((s.split('/', 1)[0] for s in scripts)):
-            for f in os.listdir(scripts_root / pkg_name / 'scripts'):
-                shutil.move(str(scripts_root / pkg_name / 'scripts' / f), scripts_root / pkg_name)
-                db_update_test(scripts_root, os.path.join(pkg_name, f), user, organization, team, package, version)
-            shutil.rmtree(scripts_root / pkg_name / 'scripts')
+    try:
+        installed = extract_package(pkg_file, scripts_root, libraries_root)
+    except (zipfile.BadZipFile, OSError) as e:
+        current_app.logger.error(f'Failed to extract the package {package.name}: {e}')
+        return False
+    finally:
+        invalidate_tree_digest(libraries_root)
+    bulk_update_tests(scripts_root, installed, user, organization, team, package, version)
     package.modify(inc__download_times=1)
     return True
 
-def db_update_test(scripts_dir, script, user, organization, team, package=None, version=None):
+def _swap_in(new, target, replaced):
+    """
+    Replace the target with the new one by renaming, the old target is moved to replaced
+
+    The target is moved away even if there is no new one, then the package has nothing left under that root.
+    """
+    if os.path.lexists(target):
+        os.makedirs(os.path.dirname(replaced), exist_ok=True)
+        os.rename(target, replaced)
+    if os.path.lexists(new):
+        os.rename(new, target)
+
+def _swap_out(new, target, replaced):
+    """
+    Undo a complete or partial _swap_in
+    """
+    if os.path.lexists(target) and not os.path.lexists(new):
+        os.rename(target, new)
+    if os.path.lexists(replaced):
+        os.rename(replaced, target)
+
+def extract_package(pkg_file, scripts_root, libraries_root):
+    """
+    Install the egg's packages into the scripts root and the libraries root
+
+    The egg is extracted in a single pass into a staging directory next to the roots, already in the final layout:
+    the files under <package>/scripts/ go to <scripts root>/<package>/ and the others go to <libraries root>.
+    Then each package is swapped in with renames, the replaced packages are kept until all swaps succeeded and
+    are swapped back if any of them fails, so a failed install leaves the installed packages untouched.
+    Return the test suites installed, relative to the scripts root.
+    """
+    scripts_root, libraries_root = Path(scripts_root), Path(libraries_root)
+    staging_root = scripts_root.parent / INSTALL_STAGING
+    # clean up what the crashed installs left
+    if os.path.exists(staging_root):
+        for d in os.scandir(staging_root):
+            if time.time() - d.stat().st_mtime > INSTALL_STAGING_TIMEOUT:
+                shutil.rmtree(d.path, ignore_errors=True)
+    staging = staging_root / uuid.uuid4().hex
+    staged_roots = (('scripts', scripts_root), ('libraries', libraries_root))
+
+    packages = set()
+    installed = []
+    swapped = []
+    try:
+        with zipfile.ZipFile(pkg_file) as zf:
+            for member in zf.infolist():
+                name = member.filename
+                parts = name.rstrip('/').split('/')
+                if name.startswith('EGG-INFO') or name.startswith('/') or '..' in parts:
+                    continue
+                packages.add(parts[0])
+                if member.is_dir():
+                    continue
+                if len(parts) > 2 and parts[1] == 'scripts':
+                    dest = staging.joinpath('scripts', parts[0], *parts[2:])
+                    if len(parts) == 3:
+                        installed.append(os.path.join(parts[0], parts[2]))
+                elif '/scripts/' in name:
+                    dest = staging.joinpath('scripts', *parts)
+                else:
+                    dest = staging.joinpath('libraries', *parts)
+                os.makedirs(dest.parent, exist_ok=True)
+                with zf.open(member) as src, open(dest, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, PACKAGE_COPY_SIZE)
+
+        for kind, root in staged_roots:
+            os.makedirs(root, exist_ok=True)
+            for pkg in packages:
+                swap = (staging / kind / pkg, root / pkg, staging / 'replaced' / kind / pkg)
+                swapped.append(swap)
+                _swap_in(*swap)
+    except Exception:
+        for swap in reversed(swapped):
+            try:
+                _swap_out(*swap)
+            except OSError as e:
+                # keep the staging directory, the replaced packages are still in it
+                staging = None
+                current_app.logger.error(f'Failed to restore {swap[1]}: {e}')
+        raise
+    finally:
+        if staging:
+            shutil.rmtree(staging, ignore_errors=True)
+    return installed
+
+def db_update_test(scripts_dir, script, user, organization, team, package=None, version=None, digest=None):
     if scripts_dir is None:
         return False
     if not script.endswith('.md'):
@@ -203,71 +290,171 @@ def db_update_test(scripts_dir, script, user, organization, team, package=None,
     else:
         test.modify(package=package, package_version=version)
 
-    ret = update_test_from_md(os.path.join(scripts_dir, script), test)
+    ret = update_test_from_md(os.path.join(scripts_dir, script), test, digest)
     if ret:
         test.update_date = datetime.datetime.utcnow()
         test.save()
         current_app.logger.critical(f'Update test suite for {script}')
     return True
 
-def update_test_from_md(md_file, test):
+def bulk_update_tests(scripts_dir, scripts, user, organization, team, package=None, version=None):
     """
-    update test cases and variables for the test
+    Do what db_update_test does for all the scripts, but with one query and one bulk write of upserts
+    """
+    md_files = {script: os.path.join(scripts_dir, script) for script in scripts if script.endswith('.md')}
+    if not md_files:
+        return 0
+    parsed_md = parse_md_files(list(md_files.values()), organization, team)
+
+    collection = Test._get_collection()
+    team_id = team.pk if team else None
+    existing = {}
+    query = {'organization': organization.pk, 'team': team_id, 'path': {'$in': list(set(os.path.dirname(s) for s in md_files))}}
+    for test in collection.find(query, {'test_suite': True, 'path': True, 'md_hash': True, 'test_cases': True, 'variables': True}):
+        existing[(test['path'], test['test_suite'])] = test
+
+    now = datetime.datetime.utcnow()
+    requests = []
+    for script, md_file in md_files.items():
+        dirname, basename = os.path.split(script)
+        test_suite = os.path.splitext(basename)[0]
+        digest, (test_cases, variables, errors) = parsed_md[md_file]
+        test = existing.get((dirname, test_suite), None)
+        fields = {'package': package.pk if package else None, 'package_version': version}
+        if not test or test.get('md_hash', None) != digest:
+            for error in errors:
+                current_app.logger.error(error)
+            # a new test suite without any test case or variable isn't worth saving
+            if not test and not test_cases and not variables:
+                continue
+            fields['md_hash'] = digest
+            if not test or test.get('test_cases', []) != test_cases or test.get('variables', {}) != variables:
+                fields.update(test_cases=test_cases, variables=variables, update_date=now)
+                current_app.logger.critical(f'Update test suite for {script}')
+        requests.append(UpdateOne(
+            {'test_suite': test_suite, 'path': dirname, 'organization': organization.pk, 'team': team_id},
+            {'$set': fields,
+             '$setOnInsert': {'schema_version': '1', 'author': user.pk, 'create_date': now, 'staled': False}},
+            upsert=True))
+    if requests:
+        collection.bulk_write(requests, ordered=False)
+    return len(requests)
+
+def hash_md_file(md_file):
+    with open(md_file, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def parse_md(text):
+    """
+    Extract the test cases and variables from the markdown text of a test suite
+
+    Return the test cases, the variables and the errors found.
     """
-    ret = False
     test_cases = []
     variables = {}
-    with open(md_file, encoding='utf-8') as f:
-        parser = mistune.BlockLexer()
-        text = f.read()
-        parser.parse(mistune.preprocessing(text))
-        for t in parser.tokens:
-            if t["type"] == "table":
-                table_header = t["header"][0].lower()
-                if table_header == 'test case' or table_header == 'test cases':
-                    for c in t["cells"]:
-                        if not c[0] == '---':
-                            test_cases.append(c[0])
-                            break
-                if table_header == 'variable' or table_header == 'variables':
-                    list_var = None
-                    for c in t["cells"]:
-                        if c[0].startswith('#') or c[0].startswith('---'):
-                            continue
-                        if c[0].startswith('${'):
-                            list_var = None
-                            dict_var = None
-                            variables[filter_kw(c[0])] = c[1]
-                        elif c[0].startswith('@'):
-                            dict_var = None
-                            list_var = filter_kw(c[0])
-                            variables[list_var] = c[1:]
-                        elif c[0].startswith('...'):
-                            if list_var:
-                                variables[list_var].extend(c[1:])
-                            elif dict_var:
-                                for i in c[1:]:
-                                    if not i:
-                                        continue
-                                    k, v = i.split('=')
-                                    variables[dict_var][k] = v
-                        elif c[0].startswith('&'):
-                            list_var = None
-                            dict_var = filter_kw(c[0])
-                            variables[dict_var] = {}
+    errors = []
+    parser = mistune.BlockLexer()
+    parser.parse(mistune.preprocessing(text))
+    for t in parser.tokens:
+        if t["type"] == "table":
+            table_header = t["header"][0].lower()
+            if table_header == 'test case' or table_header == 'test cases':
+                for c in t["cells"]:
+                    if not c[0] == '---':
+                        test_cases.append(c[0])
+                        break
+            if table_header == 'variable' or table_header == 'variables':
+                list_var = None
+                for c in t["cells"]:
+                    if c[0].startswith('#') or c[0].startswith('---'):
+                        continue
+                    if c[0].startswith('${'):
+                        list_var = None
+                        dict_var = None
+                        variables[filter_kw(c[0], errors)] = c[1]
+                    elif c[0].startswith('@'):
+                        dict_var = None
+                        list_var = filter_kw(c[0], errors)
+                        variables[list_var] = c[1:]
+                    elif c[0].startswith('...'):
+                        if list_var:
+                            variables[list_var].extend(c[1:])
+                        elif dict_var:
                             for i in c[1:]:
                                 if not i:
                                     continue
                                 k, v = i.split('=')
                                 variables[dict_var][k] = v
-                        else:
-                            current_app.logger.error('Unknown tag: ' + c[0])
+                    elif c[0].startswith('&'):
+                        list_var = None
+                        dict_var = filter_kw(c[0], errors)
+                        variables[dict_var] = {}
+                        for i in c[1:]:
+                            if not i:
+                                continue
+                            k, v = i.split('=')
+                            variables[dict_var][k] = v
+                    else:
+                        errors.append('Unknown tag: ' + c[0])
+    return test_cases, variables, errors
+
+def parse_md_file(md_file):
+    with open(md_file, encoding='utf-8') as f:
+        return parse_md(f.read())
+
+def parse_md_files(md_files, organization, team):
+    """
+    Parse the markdown files into MD_PARSE_CACHE
+
+    The files already parsed are skipped, so are the files having the same content as a test suite of the
+    organization/team, whose test cases and variables are taken from that test suite instead.
+    Return {markdown file: (sha1 of its content, (test cases, variables, errors))}, which holds all the files
+    even if there are more than the cache can.
+    """
+    digests = {f: hash_md_file(f) for f in md_files}
+    query = {'organization': organization.pk, 'team': team.pk if team else None,
+             'md_hash': {'$in': list(set(digests.values()))}}
+    known = {}
+    for test in Test._get_collection().find(query, {'md_hash': True, 'test_cases': True, 'variables': True}):
+        known[test['md_hash']] = (test.get('test_cases', []), test.get('variables', {}), [])
+        if MD_PARSE_CACHE.get(test['md_hash']) is None:
+            MD_PARSE_CACHE.set(test['md_hash'], known[test['md_hash']])
+    return {f: (digest, known.get(digest, None) or get_parsed_md(f, digest)) for f, digest in digests.items()}
+
+def get_parsed_md(md_file, digest):
+    parsed = MD_PARSE_CACHE.get(digest)
+    if parsed is None:
+        parsed = parse_md_file(md_file)
+        MD_PARSE_CACHE.set(digest, parsed)
+    return parsed
+
+def update_test_from_md(md_file, test, digest=None):
+    """
+    update test cases and variables for the test
+
+    A file with the same content as the last time is skipped without parsing, the results are cached by the content hash.
+    Return True if the test needs to be saved.
+    """
+    ret = False
+    if digest is None:
+        digest = hash_md_file(md_file)
+    if test.md_hash == digest:
+        return ret
+
+    test_cases, variables, errors = get_parsed_md(md_file, digest)
+    for error in errors:
+        current_app.logger.error(error)
+
+    test.md_hash = digest
     if test.test_cases != test_cases:
-        test.test_cases = test_cases
+        test.test_cases = list(test_cases)
         ret = True
     if test.variables != variables:
-        test.variables = variables
+        test.variables = copy.deepcopy(variables)
         ret = True
+    if not ret and test.id:
+        # nothing changed but the formatting, remember the content to skip it next time
+        test.modify(md_hash=digest)
     return ret
 
 def find_modules(script):
@@ -0,0 +1,131 @@
+import codecs
+import os
+import threading
+import weakref
+from collections import deque
+
+LOG_TAIL_SIZE = 64 * 1024           # characters kept in memory per task
+LOG_TAIL_MIN = 4 * 1024             # a task never shrinks below this when the global limit is hit
+LOG_MEMORY_LIMIT = 64 * 1024 * 1024 # characters kept in memory for all tasks
+LOG_PAGE_SIZE = 64 * 1024           # bytes returned by a paged read
+
+
+class LogBuffer():
+    """
+    Console log of a running task
+
+    The whole log is appended to a file, only a bounded tail stays in memory for the late joiners.
+    Memory is capped per task by tail_size, and across all open buffers by LOG_MEMORY_LIMIT: once it
+    is exceeded, the largest buffers give up their tail, none of them below LOG_TAIL_MIN.
+    """
+    _total_size = 0
+    _total_lock = threading.Lock()
+    _buffers = weakref.WeakSet()
+
+    def __init__(self, path, tail_size=LOG_TAIL_SIZE):
+        self.path = path
+        self.tail_size = tail_size
+        self._file = open(path, 'a', encoding='utf-8', newline='')
+        self._tail = deque()
+        self._size = 0
+        self._written = os.fstat(self._file.fileno()).st_size  # bytes in the file
+        self._at_line_start = self._written == 0   # whether the tail starts a line
+        self._lock = threading.Lock()
+        with LogBuffer._total_lock:
+            LogBuffer._buffers.add(self)
+
+    def write(self, s):
+        if not s:
+            return
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(s)
+            self._file.flush()
+            self._written += len(s.encode('utf-8'))
+            self._tail.append(s)
+            self._size += len(s)
+            self._account(len(s))
+            if self._size > self.tail_size:
+                self._drop(self._size - self.tail_size)
+        if LogBuffer._total_size > LOG_MEMORY_LIMIT:
+            LogBuffer._enforce_limit()
+
+    def tail(self):
+        """
+        Return the tail of the log starting from a whole line if there is one, and its byte offset in the file
+        """
+        with self._lock:
+            text = ''.join(self._tail)
+            if not self._at_line_start:
+                newline = text.find('\n')
+                if newline >= 0:
+                    text = text[newline + 1:]
+            return text, self._written - len(text.encode('utf-8'))
+
+    def read(self, offset=0, size=LOG_PAGE_SIZE):
+        """
+        Read a page of the log file from the byte offset, return the text and the offset of the next page
+
+        A character cut at the end of the page is left to the next page.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(size)
+        except FileNotFoundError:
+            return '', offset
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        text = decoder.decode(data, final=len(data) < size)
+        pending = decoder.getstate()[0]
+        if not text and pending:
+            text, pending = decoder.decode(b'', final=True), b''
+        return text, offset + len(data) - len(pending)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._account(-self._size)
+            self._tail.clear()
+            self._size = 0
+        with LogBuffer._total_lock:
+            LogBuffer._buffers.discard(self)
+
+    def _account(self, size):
+        with LogBuffer._total_lock:
+            LogBuffer._total_size += size
+
+    def _drop(self, size):
+        """Drop characters from the head of the tail, the lock must be held"""
+        while size > 0:
+            head = self._tail.popleft()
+            if len(head) > size:
+                self._tail.appendleft(head[size:])
+                dropped = head[:size]
+            else:
+                dropped = head
+            self._at_line_start = dropped.endswith('\n')
+            self._size -= len(dropped)
+            self._account(-len(dropped))
+            size -= len(dropped)
+
+    @staticmethod
+    def _enforce_limit():
+        """
+        Trim the largest buffers until all of them fit in LOG_MEMORY_LIMIT
+
+        A buffer busy writing is skipped rather than waited for, its writer will check the limit again.
+        """
+        with LogBuffer._total_lock:
+            buffers = sorted(LogBuffer._buffers, key=lambda b: b._size, reverse=True)
+        for buf in buffers:
+            excess = LogBuffer._total_size - LOG_MEMORY_LIMIT
+            if excess <= 0:
+                break
+            if not buf._lock.acquire(blocking=False):
+                continue
+            try:
+                if buf._size > LOG_TAIL_MIN:
+                    buf._drop(min(excess, buf._size - LOG_TAIL_MIN))
+            finally:
+                buf._lock.release()
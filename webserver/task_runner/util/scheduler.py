@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+
+class EndpointScheduler():
+    """
+    Run the task queues of all endpoints as coroutines on a single event loop
+
+    Each endpoint gets at most one worker coroutine, so the tasks of an endpoint run one after
+    another. The worker keeps calling its process_next coroutine function until it returns False,
+    i.e. nothing is left to run, unless the endpoint has been scheduled again in the meantime.
+    At most max_running process_next calls run at the same time for all endpoints.
+
+    Under eventlet the loop's thread and its default executor's threads are green threads of the same hub,
+    so nothing run by them may block outside of eventlet, e.g. asyncio subprocesses wait in os.waitpid.
+    """
+    def __init__(self, max_running):
+        self.max_running = max_running
+        self.loop = None
+        self.app = None
+        self._workers = {}  # {endpoint id: worker task}
+        self._pending = {}  # {endpoint id: scheduled again while the worker is busy}
+        self._semaphore = None
+        self._ready = threading.Event()
+
+    def start(self, app):
+        self.app = app
+        thread = threading.Thread(target=self._run, name='task_scheduler')
+        thread.daemon = True
+        thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = asyncio.Semaphore(self.max_running)
+        self._ready.set()
+        self.loop.run_forever()
+
+    def schedule(self, endpoint_id, process_next):
+        """
+        Thread-safe, make sure a worker will check the endpoint's task queues
+        """
+        self.loop.call_soon_threadsafe(self._schedule, endpoint_id, process_next)
+
+    def call_soon(self, callback, *args):
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def is_running(self, endpoint_id):
+        return endpoint_id in self._workers
+
+    def _schedule(self, endpoint_id, process_next):
+        if endpoint_id in self._workers:
+            self._pending[endpoint_id] = True
+            self.app.logger.info('Schedule the task to the pending queue')
+            return
+        self._pending[endpoint_id] = False
+        self._workers[endpoint_id] = self.loop.create_task(self._worker(endpoint_id, process_next))
+
+    async def _worker(self, endpoint_id, process_next):
+        try:
+            while True:
+                self._pending[endpoint_id] = False
+                async with self._semaphore:
+                    more = await process_next()
+                if not more and not self._pending[endpoint_id]:
+                    break
+        except Exception as e:
+            self.app.logger.exception(e)
+        finally:
+            del self._workers[endpoint_id]
+            del self._pending[endpoint_id]
@@ -7,6 +7,7 @@ import signal
 import sys
 import traceback
 
+from socketserver import ThreadingMixIn
 from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
 from xmlrpc.client import Fault, dumps, loads
 
@@ -172,6 +173,44 @@ class StoppableXMLRPCServer(SimpleXMLRPCServer):
 
         raise Exception('method "%s" is not supported' % method)
 
+class ThreadingXMLRPCServer(ThreadingMixIn, StoppableXMLRPCServer):
+    """
+    Handle each request in its own thread, so that a long keyword of one endpoint doesn't block the others
+
+    At most max_workers calls are dispatched at the same time, of which at most max_workers_per_path
+    for the same path, i.e. the same endpoint's test library, so a busy path can't starve the others.
+    A call waits for its path's slot before it waits for a global one.
+    """
+    daemon_threads = True
+
+    def __init__(self, host, port, max_workers=64, max_workers_per_path=4):
+        super().__init__(host, port)
+        self.max_workers_per_path = max_workers_per_path
+        self._workers = threading.BoundedSemaphore(max_workers)
+        self._path_workers = {}  # {path: [semaphore, reference count]}
+        self._path_lock = threading.Lock()
+
+    def _acquire_path(self, path):
+        with self._path_lock:
+            if path not in self._path_workers:
+                self._path_workers[path] = [threading.BoundedSemaphore(self.max_workers_per_path), 0]
+            self._path_workers[path][1] += 1
+            return self._path_workers[path][0]
+
+    def _release_path(self, path):
+        with self._path_lock:
+            self._path_workers[path][1] -= 1
+            if self._path_workers[path][1] == 0:
+                del self._path_workers[path]
+
+    def _dispatch(self, method, params, path):
+        path_workers = self._acquire_path(path)
+        try:
+            with path_workers, self._workers:
+                return super()._dispatch(method, params, path)
+        finally:
+            self._release_path(path)
+
 class SignalHandler(object):
 
     def __init__(self, handler):
@@ -193,9 +232,12 @@ class SignalHandler(object):
             signal.signal(getattr(signal, name), handler)
 
 class XMLRPCServer(threading.Thread):
-    def __init__(self, rpc_proxy, host='0.0.0.0', port=8270):
+    def __init__(self, rpc_proxy, host='0.0.0.0', port=8270, max_workers=None, max_workers_per_path=None):
         super().__init__()
-        self.server = StoppableXMLRPCServer(host, port)
+        if max_workers:
+            self.server = ThreadingXMLRPCServer(host, port, max_workers, max_workers_per_path or max_workers)
+        else:
+            self.server = StoppableXMLRPCServer(host, port)
         self.rpc_proxy = rpc_proxy
         self.name = 'XMLRPCServer'
 